@@ -8,6 +8,9 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "changeme_in_production" # TODO: Change this
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8 
     
+    # Simulation
+    SIMULATION_MEMORY_BUDGET_MB: int = 256 # Per batch job, sized for 2 GB containers
+    
     # CORS
     BACKEND_CORS_ORIGINS: List[str] = [
         "http://localhost:3000",
@@ -6,6 +6,7 @@ from db.base import Base
 from db.session import engine
 # Import all models so Base.metadata.create_all works
 from models import user, inventory, quote, analytics
+from services.weather import WeatherLibrary
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -40,3 +41,4 @@ def root():
 async def startup():
     print(f"CORS ORIGINS: {settings.BACKEND_CORS_ORIGINS}")
     Base.metadata.create_all(bind=engine)
+    WeatherLibrary.index()
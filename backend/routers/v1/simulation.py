@@ -1,9 +1,44 @@
-from fastapi import APIRouter, Depends, HTTPException
-from schemas.simulation import SimulationConfig, SimulationResult
+import itertools
+import json
+from typing import Iterable, Iterator
+from fastapi import APIRouter, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from core.config import settings
+from schemas.simulation import (
+    SimulationConfig, SimulationResult, SweepRequest, AnnualRequest,
+    MonteCarloRequest, MonteCarloResult, DegradationRequest, FinancingRequest, SizingRequest,
+    OutageRequest, OutageResult
+)
 from services.calculator import CalculatorService
+from services.batch import BatchEngine
+from services.components import ComponentCatalog
+from services.degradation import BatteryDegradation
+from services.outage import OutageSimulator
+from services.sizing import SizingService
 
 router = APIRouter()
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def _ndjson(records: Iterable[dict]):
+    # One JSON document per line, flushed as soon as the generator yields it
+    for record in records:
+        yield json.dumps(jsonable_encoder(record)) + "\n"
+
+def _stream(records: Iterator[dict]) -> StreamingResponse:
+    """
+    NDJSON response of `records`. The first record is computed before the response
+    starts, so an invalid request still gets an error status instead of an empty 200.
+    """
+    try:
+        first = list(itertools.islice(records, 1))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(_ndjson(itertools.chain(first, records)), media_type=NDJSON_MEDIA_TYPE)
+
 @router.post("/run", response_model=SimulationResult)
 def run_simulation(config: SimulationConfig):
     """
@@ -12,6 +47,119 @@ def run_simulation(config: SimulationConfig):
     try:
         result = CalculatorService.run_full_simulation(config)
         return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         # In a real app we'd log this error
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/sweep")
+def run_sweep(request: SweepRequest, stream: bool = False):
+    """
+    Run one simulation per scenario (base config + overrides).
+    With `stream=true` the results are sent as NDJSON, one line per scenario.
+    """
+    records = CalculatorService.iter_sweep(request.base_config, request.scenarios)
+    if stream:
+        return _stream(records)
+    try:
+        return list(records)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/annual")
+def run_annual(request: AnnualRequest, stream: bool = False):
+    """
+    Simulate consecutive days and aggregate them per chunk of `chunk_days`.
+    With `stream=true` each chunk is sent as an NDJSON line as soon as it is computed,
+    followed by a summary line.
+    """
+    records = CalculatorService.iter_annual(request.config, request.days, request.chunk_days, request.seed)
+    if stream:
+        return _stream(records)
+    try:
+        *chunks, summary = list(records)
+        return {"chunks": chunks, "summary": summary}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/monte-carlo", response_model=MonteCarloResult)
+def run_monte_carlo(request: MonteCarloRequest):
+    """
+    Monte Carlo over random days. Scenarios are simulated in chunks sized to the
+    memory budget and reduced to aggregates, so large studies keep a bounded footprint.
+    """
+    iterations = request.iterations or request.config.monte_iterations
+    budget = request.memory_budget_mb or settings.SIMULATION_MEMORY_BUDGET_MB
+    try:
+        return BatchEngine.run_monte_carlo(request.config, iterations, budget, request.seed, request.top_k)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/degradation")
+def run_degradation(request: DegradationRequest, stream: bool = False):
+    """
+    Year-by-year battery capacity fade (rainflow cycles + calendar ageing), each
+    year simulated with the capacity left by the previous ones.
+    """
+    records = BatteryDegradation.project(request.config, request.years, request.seed)
+    if stream:
+        return _stream(records)
+    try:
+        return list(records)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/financing")
+def run_financing(request: FinancingRequest):
+    """
+    Net-of-financing cash flow metrics for every financing offer x scenario.
+    Each scenario is simulated once; the offers are evaluated in one batched call.
+    """
+    try:
+        return CalculatorService.financing_sweep(request.base_config, request.scenarios, request.offers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/size")
+def run_sizing(request: SizingRequest):
+    """
+    Recommended solar kW and battery size for a household from its monthly bill.
+    All candidates are simulated in one batch, fast enough for the wizard to call
+    on every input change. With `product_ids` the system is sized in the catalog
+    products' units (compiled once per product, not per call).
+    """
+    product_ids = request.product_ids or request.base_config.product_ids
+    try:
+        bundle = ComponentCatalog.load(product_ids) if product_ids else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        return SizingService.size(request, bundle)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/outage", response_model=OutageResult)
+def run_outage(request: OutageRequest):
+    """
+    Backup performance during grid outages: served and unserved EV demand and hours
+    of full backup over sampled outage start times and durations.
+    """
+    try:
+        return OutageSimulator.run(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,5 +1,13 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Optional, Dict, Any, Literal
+
+class FinancingOption(BaseModel):
+    name: Optional[str] = None
+    type: Literal["cash", "loan", "lease"] = "loan"
+    term_months: int = Field(120, ge=1, le=600)
+    apr: float = Field(0.08, ge=0)
+    down_payment_fraction: float = Field(0.2, ge=0, le=1)
+    lease_rate: float = Field(0.012, ge=0, description="Monthly lease payment as a fraction of the initial capex")
 
 class SimulationConfig(BaseModel):
     # General
@@ -7,9 +15,45 @@ class SimulationConfig(BaseModel):
     charging_station_power: float = Field(30.0, description="kW")
     charging_price: float = Field(0.17, description="$/kWh")
     
+    # Residential sites: a home whose base load is usage_profile_type scaled to cost
+    # monthly_bill ($) at the tariff. EV stations only add load with include_ev_load.
+    # Served energy is valued at the avoided tariff instead of charging_price.
+    site_type: Literal["charging_station", "residential"] = "charging_station"
+    monthly_bill: float = Field(100.0, ge=0, description="$/month")
+    usage_profile_type: str = "standard"
+    include_ev_load: bool = False
+    
     # Solar
     solar_capacity: float = Field(20.0, description="kW")
+    # Variation of the synthetic profile: "uniform" independent noise of solar_randomness
+    # per step, or opt-in "markov" day-level sky states with correlated clouds within
+    # the day (fitted from the weather library, which only holds synthetic samples so far)
+    solar_variability: Literal["markov", "uniform"] = "uniform"
     solar_randomness: float = Field(0.1, ge=0.0, le=1.0)
+    # Typical-year weather file (backend/data/weather) replacing the synthetic sine profile;
+    # solar_randomness does not apply, the day-to-day variation comes from the data
+    weather_site: Optional[str] = None
+    # Without a weather_site, a location interpolates the weather of the nearest sites
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+    # Array orientation, used with a weather_site: tilt from horizontal and compass azimuth
+    # of the panel facing (180 = south) in degrees. shading_loss is the share of direct sun lost.
+    panel_tilt: float = Field(0.0, ge=0, le=90)
+    panel_azimuth: float = Field(180.0, ge=0, lt=360)
+    shading_loss: float = Field(0.0, ge=0, le=1)
+    ground_albedo: float = Field(0.2, ge=0, le=1)
+    # Solar export: with sell_excess the surplus left after the load and the battery is
+    # sold at selling_excess_price, up to selling_percentage of the solar produced so far
+    # in the day and export_limit_kw at any time. Surplus that is not sold is curtailed.
+    sell_excess: bool = False
+    selling_excess_price: float = Field(0.07, ge=0, description="$/kWh")
+    selling_percentage: float = Field(0.5, ge=0, le=1)
+    export_limit_kw: Optional[float] = Field(None, ge=0, description="kW, None = unlimited")
+    
+    # Catalog products (panel, battery, inverter) replacing the generic component numbers:
+    # a pack is one battery unit, and with panel_count the array is that many panels
+    product_ids: List[int] = []
+    panel_count: Optional[int] = Field(None, ge=0)
     
     # Battery
     use_battery: bool = True
@@ -21,6 +65,27 @@ class SimulationConfig(BaseModel):
     battery_max_charge_power: float = 15.0 # kW
     battery_efficiency: float = 0.9
     battery_degradation_cost: float = 0.05
+    # Dispatch: "greedy" self-consumption, "tou_arbitrage" (grid top-up at the cheapest
+    # rate, discharge above its cost), "peak_shaving" or "optimal" DP against the
+    # day's known tariff / solar / demand
+    dispatch_strategy: Literal["greedy", "tou_arbitrage", "peak_shaving", "optimal"] = "greedy"
+    dispatch_soc_levels: int = Field(101, ge=2, le=2000) # SoC grid of the optimal solver
+    battery_grid_charging: bool = True # Whether non-greedy strategies may charge from the grid
+    peak_shaving_target_kw: Optional[float] = Field(None, gt=0) # None = site import limit or average import
+    # Capacity fade: rainflow cycles of depth D use 1 / (cycle_life * D^-exponent) of the
+    # cycle life; battery_lifetime is the calendar life. Both fade to end_of_life_capacity.
+    battery_cycle_life: float = Field(3500.0, gt=0, description="Cycles to end of life at 100% DoD")
+    battery_dod_exponent: float = Field(1.3, gt=0)
+    battery_end_of_life_capacity: float = Field(0.8, gt=0, lt=1)
+    
+    # Site grid connection (shared transformer), None = unlimited
+    site_import_limit_kw: Optional[float] = Field(None, gt=0, description="kW")
+    
+    # Smart charging: keep site import under a managed peak cap
+    site_power_cap_kw: Optional[float] = Field(None, gt=0, description="kW, None = no load management")
+    load_allocation_policy: Literal["pro_rata", "equal_share", "fcfs", "priority"] = "pro_rata"
+    station_priorities: Optional[List[float]] = None # One per station, higher is served first
+    load_shifting: bool = False # Delay curtailed energy to later steps instead of dropping it
     
     # Grid / Costs
     inverter_efficiency: float = 0.95
@@ -38,6 +103,16 @@ class SimulationConfig(BaseModel):
     inverter_lifetime: float = 10.0
     installation_lifetime: float = 10.0
     
+    # Project finance (lifetime cash flows)
+    project_years: int = Field(25, ge=1, le=50)
+    discount_rate: float = Field(0.08, gt=-1)
+    tariff_escalation: float = 0.03 # Grid cost growth per year
+    charging_price_escalation: float = 0.02 # Charging price growth per year
+    capex_escalation: float = 0.0 # Replacement equipment price change per year
+    discount_rate_std: float = Field(0.0, ge=0) # Monte Carlo spread of the discount rate
+    escalation_std: float = Field(0.0, ge=0) # Monte Carlo spread of both escalation rates
+    financing: Optional[FinancingOption] = None # None = cash purchase
+    
     # Grid Tariffs
     off_peak_rate: float = 0.06
     normal_rate: float = 0.108
@@ -47,10 +122,44 @@ class SimulationConfig(BaseModel):
     peak_start_evening: float = 17.0
     peak_end_evening: float = 20.0
     
+    # Energy tariff: "tou" uses the rates above, "tiered" bills monthly cumulative
+    # import in increasing blocks (residential). Defaults follow the EVN residential
+    # blocks converted to USD.
+    tariff_type: Literal["tou", "tiered"] = "tou"
+    tier_thresholds_kwh: List[float] = [50, 100, 200, 300, 400]
+    tier_rates: List[float] = [0.072, 0.075, 0.087, 0.109, 0.122, 0.126] # $/kWh, one more than thresholds
+    # Utility tariff from the library (backend/data/tariffs), overrides the rates above
+    tariff_id: Optional[str] = None
+    tariff_year: int = 2024
+    
+    # Grid carbon intensity: a region from the library (backend/data/emissions),
+    # else the flat grid_emission_factor
+    emission_region: Optional[str] = None
+    grid_emission_factor: float = Field(0.66, ge=0, description="kg CO2/kWh")
+    
+    # Demand charges ($ per kW of monthly maximum demand)
+    demand_charge_rate: float = Field(0.0, ge=0, description="$/kW-month on the monthly peak")
+    peak_demand_charge_rate: float = Field(0.0, ge=0, description="$/kW-month on the peak inside TOU peak windows")
+    demand_window_minutes: Literal[15, 30, 60] = 30
+    
     # Advanced
     monte_iterations: int = 50
     daily_ev_demand: float = 50.0  # Used in simplified simulations
     charging_sessions_per_day: int = 12
+    session_duration_minutes: float = Field(30.0, gt=0, le=1440) # A session fits in the day
+    
+    # EV demand model: "slots" marks random session slots, "sessions" runs the
+    # event-driven queue simulator (arrivals, ports, waiting, balking)
+    demand_model: Literal["slots", "sessions"] = "slots"
+    ports_per_station: int = Field(1, ge=1)
+    session_energy_mean_kwh: float = Field(15.0, gt=0)
+    session_energy_std_kwh: float = Field(5.0, ge=0)
+    max_queue_length: Optional[int] = Field(2, ge=0, description="Arrivals balk when this many vehicles wait; None = unlimited")
+    arrival_hourly_profile: Optional[List[float]] = Field(None, min_length=24, max_length=24, description="Empirical hour-of-day arrival weights; uniform if omitted")
+    time_resolution_minutes: Literal[5, 15, 30, 60] = 30
+    # Batch / Monte Carlo engine precision. float32 halves memory and bandwidth;
+    # see scripts/validate_float32.py for the KPI tolerance check.
+    compute_dtype: Literal["float64", "float32"] = "float64"
 
 class SimulationResult(BaseModel):
     daily: dict
@@ -58,3 +167,77 @@ class SimulationResult(BaseModel):
     yearly: dict
     annual_summary: dict
     roi_metrics: dict
+
+class SweepRequest(BaseModel):
+    base_config: SimulationConfig = SimulationConfig()
+    # Each entry overrides fields of base_config for one scenario
+    scenarios: List[Dict[str, Any]] = []
+
+class AnnualRequest(BaseModel):
+    config: SimulationConfig = SimulationConfig()
+    days: int = Field(365, ge=1, le=3650)
+    chunk_days: int = Field(30, ge=1, description="Days aggregated per streamed record")
+    seed: int = 42
+
+class FinancingRequest(BaseModel):
+    base_config: SimulationConfig = SimulationConfig()
+    scenarios: List[Dict[str, Any]] = [{}] # Config overrides, as in SweepRequest
+    offers: List[FinancingOption] = Field(..., min_length=1)
+
+class SizingRequest(BaseModel):
+    # Same names as the quote wizard's QuoteRequest, so a quote can be posted as is
+    monthly_bill: float = Field(..., gt=0, description="$/month")
+    usage_profile_type: str = "standard"
+    roof_area: Optional[float] = Field(None, gt=0, description="m2")
+    location: Optional[str] = None # "lat,lon"
+    property_details: Dict[str, Any] = {}
+    base_config: SimulationConfig = SimulationConfig(site_type="residential", num_stations=1)
+    # Catalog products (panel, battery, inverter) to size with, else the generic config numbers
+    product_ids: List[int] = []
+    days: int = Field(28, ge=1, le=365, description="Random days per candidate")
+    seed: int = 42
+
+class DegradationRequest(BaseModel):
+    config: SimulationConfig = SimulationConfig()
+    years: int = Field(10, ge=1, le=40)
+    seed: int = 42
+
+class MonteCarloRequest(BaseModel):
+    config: SimulationConfig = SimulationConfig()
+    iterations: Optional[int] = Field(None, ge=1, le=1_000_000, description="Defaults to config.monte_iterations")
+    seed: int = 0
+    memory_budget_mb: Optional[float] = Field(None, gt=0, description="Defaults to SIMULATION_MEMORY_BUDGET_MB")
+    top_k: int = Field(5, ge=0, le=100)
+
+class OutageRequest(BaseModel):
+    config: SimulationConfig = SimulationConfig()
+    samples: int = Field(5000, ge=1, le=1_000_000)
+    # Outages start on one of `days` consecutive days from day_index, at an hour
+    # drawn from start_hour_weights (uniform if omitted)
+    days: int = Field(28, ge=1, le=365)
+    day_index: int = Field(0, ge=0, lt=365)
+    start_hour_weights: Optional[List[float]] = Field(None, min_length=24, max_length=24)
+    # duration_hours is the median of a lognormal (spread duration_sigma), the mean
+    # of an exponential, or the duration itself with "fixed"
+    duration_distribution: Literal["lognormal", "exponential", "fixed"] = "lognormal"
+    duration_hours: float = Field(4.0, gt=0)
+    duration_sigma: float = Field(0.8, ge=0)
+    max_duration_hours: float = Field(72.0, gt=0)
+    seed: int = 0
+
+class OutageResult(BaseModel):
+    samples: int
+    battery_capacity_kwh: float
+    # Share of outages ridden through without unserved load, and of EV demand served
+    full_backup_probability: float
+    ev_served_fraction: float
+    # Metric -> {mean, std, min, max, sum, p5, p50, p95}
+    metrics: Dict[str, Dict[str, float]]
+
+class MonteCarloResult(BaseModel):
+    iterations: int
+    chunk_size: int
+    chunks: int
+    # KPI -> {mean, std, min, max, sum, p5, p50, p95}
+    metrics: Dict[str, Dict[str, float]]
+    best: List[Dict[str, float]]
@@ -0,0 +1,66 @@
+import sys
+import os
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+from schemas.simulation import SimulationConfig
+from services.calculator import CalculatorService
+from services.dispatch import DISPATCH_STRATEGIES
+from services.tariffs import TariffService
+
+BATCH_SIZES = [1, 100, 1000]
+
+# One site profile per product tier
+SCENARIOS = {
+    "home": {"solar_capacity": 8.0, "number_of_battery_packs": 2, "battery_max_charge_power": 5.0, "charging_station_power": 7.4},
+    "commercial": {},
+    "depot": {"num_stations": 20, "charging_sessions_per_day": 30, "site_power_cap_kw": 400.0, "demand_charge_rate": 10.0},
+    # Demand-charge tariffs, the case peak shaving is for
+    "home_demand": {"solar_capacity": 8.0, "number_of_battery_packs": 2, "battery_max_charge_power": 5.0, "charging_station_power": 7.4, "demand_charge_rate": 10.0},
+    "commercial_demand": {"demand_charge_rate": 10.0},
+}
+
+def benchmark(config: SimulationConfig, batch: int, seed: int = 0) -> dict:
+    """
+    Time one batch of random days through the site engine and report the daily
+    energy cost and the demand charge per scenario (day standing for a month).
+    """
+    dt = config.time_resolution_minutes / 60.0
+    rng = np.random.default_rng(seed)
+    station_demand = CalculatorService.sample_station_demand(config, batch, rng, dt)
+    solar = CalculatorService.sample_solar(config, batch, rng, dt)
+    rates = CalculatorService.get_rate_schedule(config, solar.shape[1], dt)
+
+    start = time.perf_counter()
+    sim = CalculatorService.simulate_site(config, station_demand, solar, rates, dt)
+    elapsed = time.perf_counter() - start
+
+    peaks = TariffService.monthly_peaks(config, sim["grid_import_arr"], dt)
+    demand_charges = TariffService.demand_charges(config, peaks["peak_kw"], peaks["tou_peak_kw"]).sum(axis=-1)
+    energy_cost = (sim["cost_grid_arr"] + sim["cost_battery_arr"]).sum(axis=-1)
+    lost_revenue = sim["unserved_arr"].sum(axis=-1) * config.charging_price
+    return {
+        "ms_per_scenario": elapsed * 1000 / batch,
+        "energy_cost": float(energy_cost.mean()),
+        "peak_kw": float(peaks["peak_kw"].max(axis=-1).mean()),
+        "monthly_cost": float((energy_cost * 30 + demand_charges + lost_revenue * 30).mean()),
+    }
+
+def run_benchmarks():
+    print(f"{'scenario':<19}{'strategy':<15}{'batch':>6}{'ms/scen':>10}{'$/day':>9}{'peak kW':>9}{'$/month':>10}{'vs best':>9}")
+    for name, overrides in SCENARIOS.items():
+        rows = []
+        for strategy in DISPATCH_STRATEGIES:
+            config = SimulationConfig(**overrides, dispatch_strategy=strategy)
+            for batch in BATCH_SIZES:
+                rows.append((strategy, batch, benchmark(config, batch)))
+        # Same seed per batch size, so costs are comparable across strategies
+        best = {batch: min(r["monthly_cost"] for _, b, r in rows if b == batch) for batch in BATCH_SIZES}
+        for strategy, batch, r in rows:
+            gap = r["monthly_cost"] / best[batch] - 1 if best[batch] else 0.0
+            print(f"{name:<19}{strategy:<15}{batch:>6}{r['ms_per_scenario']:>10.3f}{r['energy_cost']:>9.2f}"
+                  f"{r['peak_kw']:>9.1f}{r['monthly_cost']:>10.1f}{gap:>9.1%}")
+
+if __name__ == "__main__":
+    run_benchmarks()
@@ -0,0 +1,53 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from schemas.simulation import SimulationConfig
+from services.batch import BatchEngine, KPI_KEYS
+
+# Relative tolerance on aggregate KPIs (mean and quantiles) of float32 vs float64.
+# The denominator is floored at the KPI's spread (and 1) so KPIs whose mean is
+# near zero, like the NPV of a marginal project, are compared on their own scale.
+REL_TOLERANCE = 1e-4
+STATS = ["mean", "std", "p5", "p50", "p95"]
+
+SCENARIOS = {
+    "default": {},
+    "no_battery": {"use_battery": False},
+    "large_battery": {"number_of_battery_packs": 40, "battery_max_charge_power": 60.0},
+    "large_solar": {"solar_capacity": 200.0, "solar_variability": "uniform", "solar_randomness": 0.5},
+    "depot": {"num_stations": 50, "charging_sessions_per_day": 40},
+}
+
+def validate_float32(iterations: int = 10000, seed: int = 0) -> bool:
+    """
+    Run the same Monte Carlo in both precisions and compare the aggregate KPIs.
+    The budget fits every scenario in one chunk for both dtypes, so both runs
+    draw identical random inputs and any difference is rounding only.
+    """
+    ok = True
+    for name, overrides in SCENARIOS.items():
+        results = {}
+        for dtype in ("float64", "float32"):
+            config = SimulationConfig(**overrides, compute_dtype=dtype)
+            budget_mb = iterations * BatchEngine.scenario_bytes(config) / 2**20 + 1
+            results[dtype] = BatchEngine.run_monte_carlo(config, iterations, budget_mb, seed=seed)
+
+        worst = 0.0
+        for kpi in KPI_KEYS:
+            for stat in STATS:
+                ref = results["float64"]["metrics"][kpi][stat]
+                val = results["float32"]["metrics"][kpi][stat]
+                scale = max(abs(ref), results["float64"]["metrics"][kpi]["std"], 1.0)
+                err = abs(val - ref) / scale
+                worst = max(worst, err)
+                if err > REL_TOLERANCE:
+                    ok = False
+                    print(f"  FAIL {name}: {kpi}.{stat} float64={ref:.6f} float32={val:.6f} rel_err={err:.2e}")
+        print(f"{name}: worst relative error {worst:.2e}")
+    return ok
+
+if __name__ == "__main__":
+    passed = validate_float32()
+    print("float32 validation " + ("passed" if passed else "FAILED"))
+    sys.exit(0 if passed else 1)
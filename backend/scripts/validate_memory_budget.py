@@ -0,0 +1,59 @@
+import sys
+import os
+import tracemalloc
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from schemas.simulation import SimulationConfig
+from services.batch import BatchEngine
+
+BUDGETS_MB = [4, 32]
+
+# The configurations that drive the per-scenario footprint: stations, site cap
+# allocation policy, load shifting, tariff type, dtype, resolution and the optimal solver
+SCENARIOS = {
+    "default": {},
+    "depot": {"num_stations": 50},
+    "depot_equal_share": {"num_stations": 50, "site_power_cap_kw": 100.0, "load_allocation_policy": "equal_share"},
+    "depot_fcfs": {"num_stations": 50, "site_power_cap_kw": 100.0, "load_allocation_policy": "fcfs"},
+    "depot_priority": {"num_stations": 50, "site_power_cap_kw": 100.0, "load_allocation_policy": "priority"},
+    "load_shifting": {"num_stations": 10, "site_power_cap_kw": 60.0, "load_shifting": True},
+    "residential_tiered": {"site_type": "residential", "tariff_type": "tiered"},
+    "float32": {"compute_dtype": "float32"},
+    "five_minute": {"num_stations": 10, "time_resolution_minutes": 5},
+    "optimal": {"dispatch_strategy": "optimal"},
+    # A fine SoC grid with a battery that can cross it in one step: (levels x moves) per scenario
+    "optimal_fine_grid": {"dispatch_strategy": "optimal", "dispatch_soc_levels": 1000, "battery_max_charge_power": 50.0},
+    # Peak tariff above charging_price under an import limit: non-convex costs, the window solver
+    "optimal_import_limit": {"dispatch_strategy": "optimal", "dispatch_soc_levels": 200, "battery_max_charge_power": 50.0,
+                             "site_import_limit_kw": 10.0, "charging_price": 0.1},
+}
+
+def validate_memory_budget(chunks: int = 3, seed: int = 0) -> bool:
+    """
+    Run each Monte Carlo over a few chunks under tracemalloc and check that the
+    peak stays within memory_budget_mb. Caches (tariffs, profiles) are warmed by
+    a small run first, so the peak is the chunk working set.
+    """
+    ok = True
+    for budget_mb in BUDGETS_MB:
+        for name, overrides in SCENARIOS.items():
+            config = SimulationConfig(**overrides)
+            iterations = chunks * BatchEngine.chunk_size(config, budget_mb)
+            BatchEngine.run_monte_carlo(config, 10, budget_mb, seed=seed)
+
+            tracemalloc.start()
+            BatchEngine.run_monte_carlo(config, iterations, budget_mb, seed=seed)
+            peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+
+            status = "ok"
+            if peak_mb > budget_mb:
+                ok = False
+                status = "FAIL"
+            print(f"{name} @ {budget_mb} MB: peak {peak_mb:.1f} MB ({peak_mb / budget_mb:.0%}) {status}")
+    return ok
+
+if __name__ == "__main__":
+    passed = validate_memory_budget()
+    print("memory budget validation " + ("passed" if passed else "FAILED"))
+    sys.exit(0 if passed else 1)
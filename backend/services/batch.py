@@ -0,0 +1,245 @@
+from typing import Dict, List, Optional
+import numpy as np
+from schemas.simulation import SimulationConfig
+from services.calculator import CalculatorService
+from services.dispatch import SOLVE_BLOCK_MB
+from services.finance import FinanceService
+from services.load_management import LoadManager
+from services.tariffs import TariffService
+
+# Number of (scenarios x steps) arrays alive while a chunk is simulated:
+# the site result arrays plus the battery scan state and its temporaries.
+ARRAYS_PER_SCENARIO = 28
+# Of which float64 whatever the compute dtype (rates, emission factors, tariff sums)
+FLOAT64_ARRAYS_PER_SCENARIO = 4
+# Per-station (scenarios x stations x steps) arrays: demand, shortfall share and temporaries
+ARRAYS_PER_STATION = 4
+# Extra float64 / int64 per-station arrays of the allocation policy when a site
+# limit binds: sorted requests, session starts and fill orders
+ALLOCATION_ARRAYS_PER_STATION = {"pro_rata": 0, "equal_share": 2, "priority": 2, "fcfs": 4}
+# Load shifting under a site limit: the backlog scan state and the per-station queue
+SHIFTING_ARRAYS_PER_SCENARIO = 12
+SHIFTING_ARRAYS_PER_STATION = 2
+
+KPI_KEYS = [
+    "solar_produced",
+    "grid_imported",
+    "solar_exported",
+    "solar_curtailed",
+    "revenue",
+    "operating_cost",
+    "energy_delivered",
+    "energy_unserved",
+    "energy_delayed",
+    "emissions_kg",
+    "avoided_emissions_kg",
+    "peak_demand_kw",
+    "annual_net_profit",
+    "npv",
+]
+
+class BatchEngine:
+    """
+    Same physics as CalculatorService.simulate_site_day, but for many scenarios at once.
+    Site arrays are shaped (scenarios, steps), station arrays (scenarios, stations, steps).
+    """
+
+    @staticmethod
+    def simulate(config: SimulationConfig, n: int, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+        dt = config.time_resolution_minutes / 60.0
+        dtype = np.dtype(config.compute_dtype)
+        station_demand = CalculatorService.sample_station_demand(config, n, rng, dt, dtype)
+        solar = CalculatorService.sample_solar(config, n, rng, dt, dtype)
+        base_load = CalculatorService.sample_base_load(config, n, rng, dt, dtype)
+        rates = CalculatorService.get_rate_schedule(config, solar.shape[1], dt)
+        sim = CalculatorService.simulate_site(config, station_demand, solar, rates, dt, base_load=base_load)
+        CalculatorService.apply_energy_tariff(config, sim, dt)
+        CalculatorService.apply_emissions(config, sim, dt)
+        return sim
+
+    @staticmethod
+    def summarize(sim: Dict[str, np.ndarray], config: SimulationConfig, assumptions: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, np.ndarray]:
+        """
+        Reduce per-step site arrays to per-scenario KPIs.
+        Sums accumulate in float64 whatever the compute dtype. `assumptions` are the
+        per-scenario financial rates used for the lifetime NPV.
+        """
+        total = lambda key: sim[key].sum(axis=1, dtype=np.float64)
+        revenue = total("revenue_arr")
+        operating_cost = total("cost_grid_arr") + total("cost_battery_arr")
+        unserved = total("unserved_arr")
+        annual_depreciation = FinanceService.annual_depreciation(config)
+        # Each simulated day stands for every month of the year
+        dt = config.time_resolution_minutes / 60.0
+        peaks = TariffService.monthly_peaks(config, sim["grid_import_arr"], dt)
+        annual_demand_charges = TariffService.demand_charges(config, peaks["peak_kw"], peaks["tou_peak_kw"]).sum(axis=-1) * 12
+        return {
+            "solar_produced": total("solar_total_arr"),
+            "grid_imported": total("grid_import_arr"),
+            "solar_exported": total("solar_sold_arr"),
+            "solar_curtailed": total("curtailed_arr"),
+            "revenue": revenue,
+            "operating_cost": operating_cost,
+            "energy_delivered": total("demand_arr") - unserved,
+            "energy_unserved": unserved,
+            "energy_delayed": total("delayed_arr"),
+            "emissions_kg": total("emissions_arr"),
+            "avoided_emissions_kg": total("avoided_emissions_arr"),
+            "peak_demand_kw": peaks["peak_kw"].max(axis=-1),
+            "annual_net_profit": (revenue - operating_cost) * 365 - annual_demand_charges - annual_depreciation,
+            "npv": FinanceService.evaluate(config, revenue * 365, operating_cost * 365 + annual_demand_charges, assumptions)["npv"],
+        }
+
+    @staticmethod
+    def scenario_bytes(config: SimulationConfig) -> int:
+        """
+        Peak bytes one scenario of a chunk takes, from the config: steps, stations,
+        compute dtype and, with a site limit, the allocation policy and load shifting.
+        """
+        steps = int(round(1440 / config.time_resolution_minutes))
+        itemsize = np.dtype(config.compute_dtype).itemsize
+        arrays = ARRAYS_PER_SCENARIO - FLOAT64_ARRAYS_PER_SCENARIO + ARRAYS_PER_STATION * config.num_stations
+        float64_arrays = FLOAT64_ARRAYS_PER_SCENARIO
+        if LoadManager.grid_limit_kw(config) is not None:
+            float64_arrays += ALLOCATION_ARRAYS_PER_STATION[config.load_allocation_policy] * config.num_stations
+            if config.load_shifting:
+                arrays += SHIFTING_ARRAYS_PER_SCENARIO + SHIFTING_ARRAYS_PER_STATION * config.num_stations
+        return steps * (arrays * itemsize + float64_arrays * 8)
+
+    @staticmethod
+    def chunk_size(config: SimulationConfig, memory_budget_mb: float) -> int:
+        """
+        Number of scenarios that fit in the memory budget. With the optimal solver
+        its block (SOLVE_BLOCK_MB, whatever the chunk size) is set aside first.
+        """
+        if config.dispatch_strategy == "optimal" and config.use_battery:
+            memory_budget_mb = max(memory_budget_mb - SOLVE_BLOCK_MB, memory_budget_mb / 2)
+        return max(1, int(memory_budget_mb * 1024 * 1024 // BatchEngine.scenario_bytes(config)))
+
+    @staticmethod
+    def run_monte_carlo(config: SimulationConfig, iterations: int, memory_budget_mb: float, seed: int = 0, top_k: int = 5) -> dict:
+        """
+        Monte Carlo over `iterations` random days, processed in chunks that fit the
+        memory budget. Each chunk is reduced to streaming aggregates and its per-step
+        arrays are dropped before the next chunk is simulated, so peak memory is
+        bounded by the budget rather than by `iterations`.
+        """
+        config = CalculatorService.resolve_config(config)
+        chunk = min(iterations, BatchEngine.chunk_size(config, memory_budget_mb))
+        stats = {k: StreamingStats() for k in KPI_KEYS}
+        sketches = {k: QuantileSketch() for k in KPI_KEYS}
+        best = TopK(top_k)
+
+        chunks = 0
+        for start in range(0, iterations, chunk):
+            n = min(chunk, iterations - start)
+            # Seeded per chunk: results are reproducible for a given budget
+            rng = np.random.default_rng([seed, start])
+            sim = BatchEngine.simulate(config, n, rng)
+            kpis = BatchEngine.summarize(sim, config, FinanceService.sample_assumptions(config, n, rng))
+
+            for k in KPI_KEYS:
+                stats[k].update(kpis[k])
+                sketches[k].update(kpis[k])
+            best.update(kpis["annual_net_profit"], np.arange(start, start + n), kpis)
+            chunks += 1
+            # Released before the next chunk is drawn, or two chunks would be alive at once
+            del sim, kpis
+
+        metrics = {}
+        for k in KPI_KEYS:
+            p5, p50, p95 = sketches[k].quantile([0.05, 0.5, 0.95])
+            metrics[k] = {**stats[k].result(), "p5": p5, "p50": p50, "p95": p95}
+
+        return {
+            "iterations": iterations,
+            "chunk_size": chunk,
+            "chunks": chunks,
+            "metrics": metrics,
+            "best": best.result(),
+        }
+
+# --- Streaming aggregates ---
+# Mergeable reductions used by the chunked Monte Carlo. Each holds O(1) or
+# O(capacity) state no matter how many scenarios are fed in.
+
+class StreamingStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values: np.ndarray):
+        self.count += values.size
+        self.total += float(values.sum())
+        self.total_sq += float(np.square(values).sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def result(self) -> Dict[str, float]:
+        mean = self.total / self.count
+        var = max(self.total_sq / self.count - mean * mean, 0.0)
+        return {"mean": mean, "std": float(np.sqrt(var)), "min": self.min, "max": self.max, "sum": self.total}
+
+class QuantileSketch:
+    """
+    Bounded weighted sample of a stream. When the buffer exceeds `capacity` it is
+    resampled at evenly spaced cumulative weights, so quantiles are approximate
+    (rank error in the order of 1/capacity per compression).
+    """
+    def __init__(self, capacity: int = 2048):
+        self.capacity = capacity
+        self.values = np.empty(0)
+        self.weights = np.empty(0)
+
+    def update(self, values: np.ndarray):
+        self.values = np.concatenate([self.values, np.asarray(values, dtype=np.float64).ravel()])
+        self.weights = np.concatenate([self.weights, np.ones(np.size(values))])
+        if self.values.size > self.capacity:
+            self._compress()
+
+    def _compress(self):
+        order = np.argsort(self.values)
+        values, weights = self.values[order], self.weights[order]
+        cumulative = np.cumsum(weights)
+        total = cumulative[-1]
+        targets = (np.arange(self.capacity) + 0.5) * total / self.capacity
+        idx = np.minimum(np.searchsorted(cumulative, targets), values.size - 1)
+        self.values = values[idx]
+        self.weights = np.full(self.capacity, total / self.capacity)
+
+    def quantile(self, q) -> List[float]:
+        order = np.argsort(self.values)
+        values, weights = self.values[order], self.weights[order]
+        # Rank of each retained sample at the middle of its weight
+        ranks = np.cumsum(weights) - 0.5 * weights
+        return [float(x) for x in np.interp(np.asarray(q) * weights.sum(), ranks, values)]
+
+class TopK:
+    """
+    Keeps the k best scenarios (highest score) seen so far.
+    """
+    def __init__(self, k: int):
+        self.k = k
+        self.scores = np.empty(0)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.rows: Dict[str, np.ndarray] = {}
+
+    def update(self, scores: np.ndarray, ids: np.ndarray, kpis: Dict[str, np.ndarray]):
+        if self.k <= 0:
+            return
+        scores = np.concatenate([self.scores, scores])
+        ids = np.concatenate([self.ids, ids])
+        rows = {key: np.concatenate([self.rows.get(key, np.empty(0)), v]) for key, v in kpis.items()}
+
+        keep = np.argsort(-scores)[:self.k]
+        self.scores, self.ids = scores[keep], ids[keep]
+        self.rows = {key: v[keep] for key, v in rows.items()}
+
+    def result(self) -> List[dict]:
+        return [
+            {"scenario": int(i), **{key: float(v[j]) for key, v in self.rows.items()}}
+            for j, i in enumerate(self.ids)
+        ]
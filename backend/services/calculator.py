@@ -1,10 +1,23 @@
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
 import numpy as np
 import pandas as pd
-from schemas.simulation import SimulationConfig, SimulationResult
+from schemas.simulation import SimulationConfig, SimulationResult, FinancingOption
+from services.clouds import CloudModel
+from services.components import ComponentCatalog
+from services.emissions import EmissionsLibrary
+from services.dispatch import DISPATCH_STRATEGIES, bounded_cumsum, schedule_flows
+from services.ev_sessions import EVSessionSimulator
+from services.finance import FinanceService
+from services.load_management import LoadManager
+from services.tariffs import TariffService, TariffLibrary, MONTH_OF_DAY, OFF_PEAK, PEAK
+from services.weather import WeatherLibrary
 
 # Constants from app_default could be moved here or kept in config
 SOLAR_PANEL_PRICE = 1000 # Benchmark if not provided
 INSTALLATION_PRICE = 1000 
+# Day-to-day spread of household consumption around the bill (std of the daily factor)
+DAILY_LOAD_VARIATION = 0.1
 
 class CalculatorService:
     @staticmethod
@@ -26,6 +39,17 @@ class CalculatorService:
         else:
             return config.normal_rate
 
+    @staticmethod
+    def get_rate_schedule(config: SimulationConfig, steps: int, dt: float, day_index: int = 0) -> np.ndarray:
+        """
+        Vectorized get_electricity_rate for `steps` consecutive steps starting at day `day_index`.
+        Library tariffs are sliced from their precompiled yearly rate array.
+        """
+        if config.tariff_id is not None:
+            return TariffLibrary.window(config, "rates", steps, dt, day_index)
+        periods = TariffService.tou_periods(config, steps, dt, day_index)
+        return np.where(periods == OFF_PEAK, config.off_peak_rate, np.where(periods == PEAK, config.peak_rate, config.normal_rate))
+
     @staticmethod
     def solar_irradiance(time_in_day: float) -> float:
         if 6 <= time_in_day <= 18:
@@ -35,29 +59,7 @@ class CalculatorService:
 
     @staticmethod
     def compute_infrastructure_cost(config: SimulationConfig) -> float:
-        # Calculate capital costs based on config
-        station_cost = config.charging_station_cost * config.num_stations
-        transformer_cost = config.transformer_cost
-        
-        inverter_unit_cost = config.inverter_cost if config.use_battery else 2000
-        inverter_cost = inverter_unit_cost * config.num_stations
-        
-        battery_cost = 0.0
-        if config.use_battery:
-            battery_cost = config.battery_pack_price * config.number_of_battery_packs * config.num_stations
-            
-        # Solar cost calculation from original code seemed to depend on capacity / 10 * price
-        # We'll use the provided total solar_panel_cost input as the base unit or calculate?
-        # The wizard inputs "Solar Panel Cost ($)" which seems to serve as a unit or total?
-        # In wizard.py: config["solar_panel_cost"] = solar_panel_cost (value=2000)
-        # In utils.py: solar_cost = (params.get("solar_capacity", 0) / 10) * SOLAR_PANEL_PRICE [if roi constants]
-        # or solar_cost = (params.get("solar_capacity", 0) / 10) * 1000 
-        
-        # Let's assume the input constraint: Cost per 10kW unit roughly
-        solar_cost = (config.solar_capacity / 10.0) * config.solar_panel_cost
-        install_cost = (config.solar_capacity / 10.0) * config.installation_cost
-        
-        return station_cost + transformer_cost + solar_cost + inverter_cost + install_cost + battery_cost
+        return sum(FinanceService.infrastructure_costs(config).values())
 
     @staticmethod
     def get_usage_profile(profile_type: str = "standard") -> list:
@@ -85,133 +87,522 @@ class CalculatorService:
         total = sum(p)
         return [x/total for x in p]
 
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def usage_shares(profile_type: str, resolution_minutes: int) -> np.ndarray:
+        """
+        get_usage_profile spread over the steps of a day (sums to 1). Read-only array
+        shared by every residential simulation with this profile and resolution.
+        """
+        hourly = np.asarray(CalculatorService.get_usage_profile(profile_type), dtype=np.float64)
+        steps_per_hour = 60 // resolution_minutes
+        shares = np.repeat(hourly / steps_per_hour, steps_per_hour)
+        shares.setflags(write=False)
+        return shares
+
+    @staticmethod
+    def bill_to_monthly_kwh(config: SimulationConfig) -> float:
+        """
+        Monthly consumption implied by monthly_bill. Tiered tariffs are inverted block
+        by block; TOU uses the profile-weighted average rate over the first week.
+        """
+        if config.tariff_type == "tiered":
+            return float(TariffService.tiered_kwh(config, config.monthly_bill))
+        dt = config.time_resolution_minutes / 60.0
+        shares = CalculatorService.usage_shares(config.usage_profile_type, config.time_resolution_minutes)
+        rates = CalculatorService.get_rate_schedule(config, shares.size * 7, dt).reshape(7, -1)
+        average_rate = float((rates @ shares).mean())
+        return config.monthly_bill / average_rate if average_rate > 0 else 0.0
+
+    @staticmethod
+    def sample_base_load(config: SimulationConfig, n: int, rng: np.random.Generator, dt: float = 0.5, dtype=np.float64) -> Optional[np.ndarray]:
+        """
+        Household base load (kWh per step) of a residential site for n days, shape
+        (n, steps_per_day), with a random daily level around the bill. None for charging stations.
+        """
+        if config.site_type != "residential":
+            return None
+        daily_kwh = CalculatorService.bill_to_monthly_kwh(config) * 12 / 365
+        shares = CalculatorService.usage_shares(config.usage_profile_type, config.time_resolution_minutes)
+        factor = np.clip(rng.normal(1.0, DAILY_LOAD_VARIATION, n), 0.5, 1.5)
+        return (factor[:, None] * (daily_kwh * shares)).astype(dtype, copy=False)
+
+    @staticmethod
+    def session_blocks(config: SimulationConfig, dt: float):
+        """
+        A charging session occupies `block` consecutive steps (session_duration_minutes
+        at the configured resolution). Returns (block, number of blocks per day, kWh per step).
+        """
+        steps_per_day = int(round(24 / dt))
+        block = max(1, int(round(config.session_duration_minutes / config.time_resolution_minutes)))
+        energy_per_step = config.charging_station_power * (config.session_duration_minutes / 60.0) / block
+        return block, steps_per_day // block, energy_per_step
+
     @staticmethod
     def generate_ev_demand_schedule(config: SimulationConfig, dt: float = 0.5) -> np.ndarray:
         # Note: In a real app, we might mix 'Base Load' (fridge, lights) + 'EV Load'
         # This function currently only generates the EV specific "sessions".
         # We might want to add a base load profile to the simulation.
-        steps_per_day = int(24 / dt)
+        steps_per_day = int(round(24 / dt))
+        if config.demand_model == "sessions":
+            # Derive the generator from the global seed so simulate_day stays reproducible
+            rng = np.random.default_rng(np.random.randint(0, 2**31 - 1))
+            return EVSessionSimulator.simulate(config, 1, rng, dt)["load_arr"]
+        
+        block, num_blocks, energy_per_step = CalculatorService.session_blocks(config, dt)
         ev_demand_schedule = np.zeros(steps_per_day)
         
         selected = np.random.choice(
-            np.arange(steps_per_day), 
-            size=min(config.charging_sessions_per_day, steps_per_day), 
+            np.arange(num_blocks), 
+            size=min(config.charging_sessions_per_day, num_blocks), 
             replace=False
         )
-        ev_demand_schedule[selected] = config.charging_station_power * dt
+        # Each selected block covers `block` consecutive steps
+        steps = (selected[:, None] * block + np.arange(block)).ravel()
+        ev_demand_schedule[steps] = energy_per_step
         return ev_demand_schedule
 
     @staticmethod
-    def simulate_day(config: SimulationConfig, seed: int = 42) -> dict:
-        np.random.seed(seed)
-        dt = 0.5
-        steps = int(24 / dt)
-        
-        # Arrays
-        results = {
-            "time_arr": np.zeros(steps),
-            "battery_soc_arr": np.zeros(steps),
-            "grid_import_arr": np.zeros(steps),
-            "solar_used_arr": np.zeros(steps),
-            "battery_discharged_arr": np.zeros(steps),
-            "cost_grid_arr": np.zeros(steps),
-            "cost_battery_arr": np.zeros(steps),
-            "demand_arr": np.zeros(steps),
-            "revenue_arr": np.zeros(steps),
-            "solar_total_arr": np.zeros(steps),
-            "solar_to_battery_arr": np.zeros(steps),
-            "solar_sold_arr": np.zeros(steps)
-        }
+    def sample_ev_demand(config: SimulationConfig, n: int, rng: np.random.Generator, dt: float = 0.5, dtype=np.float64) -> np.ndarray:
+        """
+        Batched generate_ev_demand_schedule: one random day per row, shape (n, steps_per_day).
+        """
+        steps_per_day = int(round(24 / dt))
+        if config.demand_model == "sessions":
+            # One continuous event simulation; rows are consecutive days
+            load = EVSessionSimulator.simulate(config, n, rng, dt)["load_arr"]
+            return load.reshape(n, steps_per_day).astype(dtype, copy=False)
+        
+        block, num_blocks, energy_per_step = CalculatorService.session_blocks(config, dt)
+        sessions = min(config.charging_sessions_per_day, num_blocks)
+        
+        # A random permutation per row; its first `sessions` entries are the chosen blocks
+        selected = np.argsort(rng.random((n, num_blocks)), axis=1)[:, :sessions]
+        blocks = np.zeros((n, num_blocks), dtype=dtype)
+        np.put_along_axis(blocks, selected, energy_per_step, axis=1)
+        
+        demand = np.zeros((n, steps_per_day), dtype=dtype)
+        demand[:, :num_blocks * block] = np.repeat(blocks, block, axis=1)
+        return demand
+
+    @staticmethod
+    def sample_station_demand(config: SimulationConfig, n: int, rng: np.random.Generator, dt: float = 0.5, dtype=np.float64) -> np.ndarray:
+        """
+        Independent EV demand for every station of the site, shape (n, num_stations, steps_per_day).
+        Residential sites without include_ev_load have none.
+        """
+        stations = config.num_stations
+        if config.site_type == "residential" and not config.include_ev_load:
+            return np.zeros((n, stations, int(round(24 / dt))), dtype=dtype)
+        if config.demand_model == "sessions":
+            # One continuous event simulation per station; rows are consecutive days
+            demand = np.stack([CalculatorService.sample_ev_demand(config, n, rng, dt, dtype) for _ in range(stations)], axis=1)
+            return demand
+        return CalculatorService.sample_ev_demand(config, n * stations, rng, dt, dtype).reshape(n, stations, -1)
+
+    @staticmethod
+    def solar_irradiance_profile(steps: int, dt: float) -> np.ndarray:
+        """
+        Vectorized solar_irradiance for `steps` consecutive steps.
+        """
+        time_in_day = (np.arange(steps) * dt) % 24
+        daylight = (time_in_day >= 6) & (time_in_day <= 18)
+        return np.where(daylight, np.sin(np.pi * (time_in_day - 6) / 12), 0.0)
+
+    @staticmethod
+    def sample_solar(config: SimulationConfig, n: int, rng: np.random.Generator, dt: float = 0.5, dtype=np.float64,
+                     day_index: Optional[int] = None) -> np.ndarray:
+        """
+        Solar production (kWh per step) for n days, shape (n, steps_per_day).
+        With a weather_site (or a latitude / longitude) the rows are days of the typical year: random days,
+        or consecutive days from `day_index`. Otherwise the sine profile is scaled by
+        per-step noise, or with solar_variability "markov" by sampled cloudiness
+        (consecutive days follow the sky-state chain).
+        """
+        located = config.latitude is not None and config.longitude is not None
+        if config.weather_site is not None or located:
+            # Orientation rounded to whole degrees (location to ~1 km) so nearby roofs share the cached geometry
+            orientation = (round(config.panel_tilt), round(config.panel_azimuth) % 360, config.shading_loss, config.ground_albedo)
+            if config.weather_site is not None:
+                profile = WeatherLibrary.pv_yield(config.weather_site, config.time_resolution_minutes, *orientation)
+            else:
+                profile = WeatherLibrary.pv_yield_at(
+                    round(config.latitude, 2), round(config.longitude, 2), config.time_resolution_minutes, *orientation
+                )
+            days = rng.integers(0, 365, n) if day_index is None else (day_index + np.arange(n)) % 365
+            return (profile[days] * (config.solar_capacity * dt)).astype(dtype, copy=False)
+        steps_per_day = int(round(24 / dt))
+        irr = CalculatorService.solar_irradiance_profile(steps_per_day, dt)
+        # Draws are always float64 so every precision sees the same random stream
+        if config.solar_variability == "markov":
+            solar = CloudModel.sample(CloudModel.default(), n, steps_per_day, dt, rng, day_index, dtype)
+        else:
+            solar = rng.uniform(1 - config.solar_randomness, 1, size=(n, steps_per_day)).astype(dtype, copy=False)
+        solar *= (config.solar_capacity * irr * dt).astype(dtype)
+        return solar
+
+    @staticmethod
+    def battery_capacity(config: SimulationConfig) -> float:
+        if not config.use_battery:
+            return 0.0
+        return config.number_of_battery_packs * (config.battery_pack_Ah * config.battery_pack_voltage / 1000.0)
+
+    @staticmethod
+    def simulate_flows(config: SimulationConfig, demand: np.ndarray, solar: np.ndarray, rates: np.ndarray, dt: float, initial_soc=None, stations: int = 1) -> dict:
+        """
+        Energy flows for a station given demand, solar (kWh per step) and grid rates.
+        Works on any leading batch shape, time is the last axis. With `stations` > 1
+        the battery is the pooled site battery (one bank per station).
+        
+        Solar serves the load first; the battery schedule comes from the
+        dispatch_strategy registered in services.dispatch (greedy self-consumption
+        by default), each of them vectorized over steps and scenarios. What solar
+        is left after that is exported or curtailed (export_flows).
+        """
+        dtype = demand.dtype
+        solar_used = np.minimum(solar, demand)
+        remaining = demand - solar_used
+        leftover_solar = solar - solar_used
+        
+        discharged = np.zeros_like(demand)
+        charged = np.zeros_like(demand)
+        grid_charged = 0.0
+        battery_soc = np.zeros_like(demand)
         
-        # setup battery
-        battery_capacity = 0.0
-        battery_soc = 0.0
+        battery_capacity = CalculatorService.battery_capacity(config) * stations
         if config.use_battery:
-            battery_capacity = config.number_of_battery_packs * (config.battery_pack_Ah * config.battery_pack_voltage / 1000.0)
-            battery_soc = config.initial_soc_fraction * battery_capacity
-            
+            if initial_soc is None:
+                initial_soc = config.initial_soc_fraction * battery_capacity
+            soc0 = np.broadcast_to(np.asarray(initial_soc, dtype=dtype), demand.shape[:-1])
+            limit_kw = LoadManager.grid_limit_kw(config)
+            strategy = DISPATCH_STRATEGIES[config.dispatch_strategy]
+            battery_soc = strategy.schedule(
+                config, remaining, leftover_solar, rates, dt, soc0, battery_capacity,
+                config.battery_max_charge_power * stations, limit_kw * dt if limit_kw is not None else None,
+            ).astype(dtype, copy=False)
+            change = np.diff(battery_soc, axis=-1, prepend=soc0[..., None])
+            discharged, charged, grid_charged = schedule_flows(config, remaining, leftover_solar, change)
+        
+        grid_import = remaining - discharged + grid_charged
+        exports = CalculatorService.export_flows(config, solar, leftover_solar - charged / config.inverter_efficiency, rates, dt)
+        return {
+            "battery_soc_arr": battery_soc,
+            "grid_import_arr": grid_import,
+            "solar_used_arr": solar_used,
+            "battery_discharged_arr": discharged,
+            "cost_grid_arr": grid_import * rates.astype(dtype),
+            "cost_battery_arr": discharged * dtype.type(config.battery_degradation_cost),
+            "demand_arr": demand,
+            "revenue_arr": demand * dtype.type(config.charging_price) + exports["export_revenue_arr"],
+            "solar_total_arr": solar,
+            "solar_to_battery_arr": charged,
+            **exports,
+        }
+
+    @staticmethod
+    def export_flows(config: SimulationConfig, solar: np.ndarray, surplus: np.ndarray, rates: np.ndarray, dt: float) -> Dict[str, np.ndarray]:
+        """
+        Splits the solar surplus left after the load and the battery (kWh per step) into
+        solar_sold_arr and curtailed_arr, with export_revenue_arr at selling_excess_price.
+        Sales are capped per step by export_limit_kw and, within each day, at
+        selling_percentage of the solar produced so far: the cumulative cap is the
+        same clipped running sum the battery scan solves, so it is one vectorized pass.
+        """
+        dtype = surplus.dtype
+        surplus = np.maximum(surplus, 0)
+        sold = np.zeros_like(surplus)
+        if config.sell_excess:
+            sold = surplus if config.export_limit_kw is None else np.minimum(surplus, dtype.type(config.export_limit_kw * dt))
+            if config.selling_percentage < 1:
+                # Days on their own axis so the cap restarts every day
+                steps = sold.shape[-1]
+                steps_per_day = int(round(24 / dt))
+                per_day = steps_per_day if steps % steps_per_day == 0 else steps
+                shape = sold.shape[:-1] + (steps // per_day, per_day)
+                produced = np.broadcast_to(solar, sold.shape).reshape(shape)
+                cap = (config.selling_percentage * np.cumsum(produced, axis=-1)).astype(dtype, copy=False)
+                cumulative = bounded_cumsum(0.0, sold.reshape(shape), np.full(shape, -np.inf, dtype=dtype), cap)
+                sold = np.clip(np.diff(cumulative, axis=-1, prepend=0).reshape(sold.shape), 0, sold).astype(dtype, copy=False)
+        return {
+            "solar_sold_arr": sold,
+            "curtailed_arr": surplus - sold,
+            "export_revenue_arr": sold * dtype.type(config.selling_excess_price),
+        }
+
+    @staticmethod
+    def simulate_day(config: SimulationConfig, seed: int = 42, day_index: int = 0) -> dict:
+        np.random.seed(seed)
+        dt = config.time_resolution_minutes / 60.0
+        steps = int(round(24 / dt))
+        
         ev_demand_schedule = CalculatorService.generate_ev_demand_schedule(config, dt)
+        irr = CalculatorService.solar_irradiance_profile(steps, dt)
+        solar_prod = config.solar_capacity * irr * np.random.uniform(1 - config.solar_randomness, 1, size=steps) * dt
+        rates = CalculatorService.get_rate_schedule(config, steps, dt, day_index)
         
-        for i in range(steps):
-            current_time = i * dt
-            time_in_day = current_time % 24
-            day_of_week = int(current_time // 24) % 7 # Assumes day 0 is Monday, just simplified
-            
-            grid_rate = CalculatorService.get_electricity_rate(time_in_day, day_of_week, config)
-            
-            # Solar
-            irr = CalculatorService.solar_irradiance(time_in_day)
-            solar_prod = config.solar_capacity * irr * np.random.uniform(1 - config.solar_randomness, 1) * dt
-            
-            # Demand
-            demand = ev_demand_schedule[i]
-            
-            # Direct Solar Usage
-            solar_used = min(solar_prod, demand)
-            remaining_demand = demand - solar_used
-            leftover_solar = solar_prod - solar_used
-            
-            # Battery Discharge
-            discharged = 0.0
-            cost_batt = 0.0
-            if remaining_demand > 0 and config.use_battery:
-                # Logic from utils.py: discharge_battery_ev
-                available_for_discharge = max(battery_soc - 0.2 * battery_capacity, 0)
-                max_discharge = config.battery_max_charge_power * dt
-                discharged = min(available_for_discharge, remaining_demand, max_discharge)
-                battery_soc -= discharged
-                cost_batt = discharged * config.battery_degradation_cost
-                remaining_demand -= discharged
-                
-            # Grid Import
-            grid_import = remaining_demand
-            cost_grid = grid_import * grid_rate
-            revenue = demand * config.charging_price
-            
-            # Charge Battery with Leftover Solar
-            charged = 0.0
-            if config.use_battery and leftover_solar > 0 and battery_soc < battery_capacity:
-                available_space = battery_capacity - battery_soc
-                charged = min(leftover_solar * config.inverter_efficiency, available_space)
-                battery_soc += charged
-                leftover_solar -= (charged / config.inverter_efficiency) # Consumed solar
-                
-            # Store results
-            results["time_arr"][i] = current_time
-            results["battery_soc_arr"][i] = battery_soc
-            results["grid_import_arr"][i] = grid_import
-            results["solar_used_arr"][i] = solar_used
-            results["battery_discharged_arr"][i] = discharged
-            results["cost_grid_arr"][i] = cost_grid
-            results["cost_battery_arr"][i] = cost_batt
-            results["demand_arr"][i] = demand
-            results["revenue_arr"][i] = revenue
-            results["solar_total_arr"][i] = solar_prod
-            results["solar_to_battery_arr"][i] = charged
+        results = CalculatorService.simulate_flows(config, ev_demand_schedule, solar_prod, rates, dt)
+        results["time_arr"] = np.arange(steps) * dt
+        return results
+
+    @staticmethod
+    def simulate_site(config: SimulationConfig, station_demand: np.ndarray, solar: np.ndarray, rates: np.ndarray, dt: float,
+                      initial_soc=None, base_load: Optional[np.ndarray] = None,
+                      initial_backlog: Optional[np.ndarray] = None, carry_backlog: bool = False) -> dict:
+        """
+        Site-level simulation of all stations at once. station_demand is (..., stations, steps),
+        solar is the shared array (..., steps). Solar and the pooled battery serve the
+        aggregate load; grid import is capped at the site limit (connection limit and/or
+        managed peak cap) and the shortfall is shared between stations by
+        load_allocation_policy. Curtailed energy is dropped unless load_shifting is on
+        (initial_backlog / carry_backlog: see simulate_site_shifting).
+        `base_load` (..., steps) is household load on top of the stations; it is never curtailed.
+        """
+        limit_kw = LoadManager.grid_limit_kw(config)
+        if config.load_shifting and limit_kw is not None:
+            return CalculatorService.simulate_site_shifting(
+                config, station_demand, solar, rates, dt, initial_soc, base_load, initial_backlog, carry_backlog,
+            )
+        
+        ev_demand = station_demand.sum(axis=-2)
+        site_demand = ev_demand if base_load is None else ev_demand + base_load
+        results = CalculatorService.simulate_flows(config, site_demand, solar, rates, dt, initial_soc, stations=config.num_stations)
+        
+        unserved = np.zeros_like(site_demand)
+        station_served = station_demand
+        if limit_kw is not None:
+            grid_import = results["grid_import_arr"]
+            unserved = np.maximum(grid_import - limit_kw * dt - (0 if base_load is None else base_load), 0)
+            results["grid_import_arr"] = grid_import - unserved
+            results["cost_grid_arr"] = results["grid_import_arr"] * rates.astype(site_demand.dtype)
             
+            # Allocate every step at once, with stations on the last axis
+            requests = np.swapaxes(station_demand, -1, -2)
+            started = LoadManager.session_start(requests) if config.load_allocation_policy == "fcfs" else None
+            served = LoadManager.allocate(config, requests, ev_demand - unserved, started)
+            station_served = np.swapaxes(served, -1, -2)
+        
+        results["station_demand_arr"] = station_demand
+        results["station_unserved_arr"] = station_demand - station_served
+        results["unserved_arr"] = unserved
+        results["delayed_arr"] = np.zeros_like(site_demand)
+        results["revenue_arr"] = CalculatorService.energy_value(config, site_demand - unserved, rates) + results["export_revenue_arr"]
         return results
 
     @staticmethod
-    def run_full_simulation(config: SimulationConfig) -> SimulationResult:
-        # Run single station simulation
-        sim_data = CalculatorService.simulate_day(config)
+    def energy_value(config: SimulationConfig, served: np.ndarray, rates: np.ndarray) -> np.ndarray:
+        """
+        Revenue per step of the energy served: charging_price at a charging station,
+        the grid cost it avoids at a residential site (so revenue - cost is the bill saving).
+        """
+        if config.site_type == "residential":
+            return served * rates.astype(served.dtype)
+        return served * served.dtype.type(config.charging_price)
+
+    @staticmethod
+    def simulate_site_shifting(config: SimulationConfig, station_demand: np.ndarray, solar: np.ndarray, rates: np.ndarray, dt: float,
+                               initial_soc=None, base_load: Optional[np.ndarray] = None,
+                               initial_backlog: Optional[np.ndarray] = None, carry_backlog: bool = False) -> dict:
+        """
+        simulate_site with load shifting: energy curtailed by the cap joins a backlog
+        that is served, oldest first, as soon as the site has room again: solar surplus
+        that would otherwise be exported or curtailed, then grid import up to the cap.
+        The battery is dispatched on the requested load.
+
+        The site backlog is the clipped running sum b[t] = max(b[t-1] + curtailed[t] - room[t], 0),
+        one bounded_cumsum over all scenarios, days and steps. Each station's share of
+        what is still queued follows from its position in the queue, so no step loop
+        is needed either. Backlog left at the end of the horizon is reported as
+        unserved at the last step, backlog served late as delayed. With carry_backlog
+        it is returned per station in station_backlog instead, to be passed as
+        `initial_backlog` (oldest in the queue) of the next period.
+        """
+        dtype = station_demand.dtype
+        limit = LoadManager.grid_limit_kw(config) * dt
+        ev_demand = station_demand.sum(axis=-2)
+        base = np.zeros_like(ev_demand) if base_load is None else base_load
+        results = CalculatorService.simulate_flows(config, ev_demand + base, solar, rates, dt, initial_soc, stations=config.num_stations)
+
+        # Only the stations are held to the cap
+        grid_import = results["grid_import_arr"]
+        curtailed = np.maximum(grid_import - limit - base, 0)
+        requests = np.swapaxes(station_demand, -1, -2)
+        started = LoadManager.session_start(requests) if config.load_allocation_policy == "fcfs" else None
+        station_curtailed = station_demand - np.swapaxes(LoadManager.allocate(config, requests, ev_demand - curtailed, started), -1, -2)
+
+        surplus = results["solar_sold_arr"] + results["curtailed_arr"]
+        room = surplus + np.maximum(limit + base - grid_import, 0)
+        if initial_backlog is None:
+            initial_backlog = np.zeros(station_demand.shape[:-1], dtype=dtype)
+        backlog0 = initial_backlog.sum(axis=-1)
+        backlog = bounded_cumsum(backlog0, curtailed - room, np.zeros_like(room), np.full_like(room, np.inf))
+        previous = np.concatenate([np.broadcast_to(backlog0[..., None], backlog.shape[:-1] + (1,)), backlog[..., :-1]], axis=-1)
+        dequeued = np.maximum(previous + curtailed - backlog, 0)
+        from_solar = np.minimum(dequeued, surplus)
+        grid_import = grid_import - curtailed + (dequeued - from_solar)
+        served_ev = ev_demand - curtailed + dequeued
+        # The oldest energy (the backlog) is served first
+        delayed = np.minimum(served_ev, previous)
+
+        # FIFO: queue entries (the carried backlog, then each step's curtailment) are
+        # served in order, so what is left is the tail of the queue past what was served
+        queued = np.concatenate([initial_backlog[..., None], station_curtailed], axis=-1)
+        queue_end = np.cumsum(queued.sum(axis=-2), axis=-1)
+        entry = np.diff(queue_end, axis=-1, prepend=0)
+        served_from_queue = queue_end[..., -1:] - backlog[..., -1:]
+        left = np.clip(queue_end - served_from_queue, 0, entry) / np.where(entry > 0, entry, 1)
+        station_backlog = (queued * left[..., None, :]).sum(axis=-1)
+
+        station_unserved = np.zeros_like(station_demand)
+        unserved = np.zeros_like(ev_demand)
+        if not carry_backlog:
+            station_unserved[..., -1] = station_backlog
+            unserved[..., -1] = backlog[..., -1]
+
+        exports = CalculatorService.export_flows(config, solar, surplus - from_solar, rates, dt)
+        served = served_ev + base
+        results.update(exports)
+        results.update({
+            "grid_import_arr": grid_import,
+            "solar_used_arr": results["solar_used_arr"] + from_solar,
+            "cost_grid_arr": grid_import * rates.astype(dtype),
+            "demand_arr": ev_demand + base,
+            "revenue_arr": CalculatorService.energy_value(config, served, rates) + exports["export_revenue_arr"],
+            "station_demand_arr": station_demand,
+            "station_unserved_arr": station_unserved,
+            "station_backlog": station_backlog,
+            "unserved_arr": unserved,
+            "delayed_arr": delayed,
+        })
+        return results
+
+    @staticmethod
+    def simulate_site_day(config: SimulationConfig, seed: int = 42, day_index: int = 0) -> dict:
+        rng = np.random.default_rng(seed)
+        dt = config.time_resolution_minutes / 60.0
         
-        # Scale by num_stations
-        n = config.num_stations
+        station_demand = CalculatorService.sample_station_demand(config, 1, rng, dt)[0]
+        solar = CalculatorService.sample_solar(config, 1, rng, dt)[0]
+        base_load = CalculatorService.sample_base_load(config, 1, rng, dt)
+        rates = CalculatorService.get_rate_schedule(config, solar.size, dt, day_index)
+        
+        results = CalculatorService.simulate_site(config, station_demand, solar, rates, dt, base_load=None if base_load is None else base_load[0])
+        results["time_arr"] = np.arange(solar.size) * dt
+        return results
+
+    @staticmethod
+    def simulate_period(config: SimulationConfig, days: int, rng: np.random.Generator, dt: float, day_index: int = 0, initial_soc=None,
+                        initial_backlog: Optional[np.ndarray] = None, carry_backlog: bool = False) -> dict:
+        """
+        Site simulation of `days` consecutive days as one continuous series.
+        """
+        # (days, stations, steps) -> (stations, days * steps)
+        station_demand = CalculatorService.sample_station_demand(config, days, rng, dt)
+        station_demand = station_demand.transpose(1, 0, 2).reshape(config.num_stations, -1)
+        solar = CalculatorService.sample_solar(config, days, rng, dt, day_index=day_index).ravel()
+        base_load = CalculatorService.sample_base_load(config, days, rng, dt)
+        rates = CalculatorService.get_rate_schedule(config, solar.size, dt, day_index=day_index)
+        return CalculatorService.simulate_site(
+            config, station_demand, solar, rates, dt, initial_soc=initial_soc,
+            base_load=None if base_load is None else base_load.ravel(),
+            initial_backlog=initial_backlog, carry_backlog=carry_backlog,
+        )
+
+    @staticmethod
+    def apply_energy_tariff(config: SimulationConfig, sim_data: dict, dt: float, day_index: Optional[int] = None, month_to_date=0.0) -> np.ndarray:
+        """
+        Re-prices cost_grid_arr for tariffs that are not a per-step rate (block pricing),
+        and for residential sites the avoided cost in revenue_arr (export revenue kept).
+        With day_index None the series is a representative day; otherwise it is a
+        continuous series starting at day_index. `month_to_date` is the (import, served
+        load) kWh billed so far in the month (a scalar applies to both); the updated
+        pair is returned to carry into the next chunk.
+        """
+        carry = np.broadcast_to(np.asarray(month_to_date, dtype=np.float64), (2,)).copy()
+        if config.tariff_type != "tiered":
+            return np.zeros(2)
+        residential = config.site_type == "residential"
+        grid_import = sim_data["grid_import_arr"]
+        served = sim_data["demand_arr"] - sim_data["unserved_arr"] if residential else None
+        if day_index is None:
+            sim_data["cost_grid_arr"] = TariffService.representative_day_costs(config, grid_import)
+            if residential:
+                sim_data["revenue_arr"] = TariffService.representative_day_costs(config, served) + sim_data["export_revenue_arr"]
+            return np.zeros(2)
+        costs, carry[0] = TariffService.tiered_costs(config, grid_import, dt, day_index, carry[0])
+        sim_data["cost_grid_arr"] = costs.astype(grid_import.dtype, copy=False)
+        if residential:
+            value, carry[1] = TariffService.tiered_costs(config, served, dt, day_index, carry[1])
+            sim_data["revenue_arr"] = value.astype(served.dtype, copy=False) + sim_data["export_revenue_arr"]
+        return carry
+
+    @staticmethod
+    def apply_emissions(config: SimulationConfig, sim_data: dict, dt: float, day_index: Optional[int] = None):
+        """
+        CO2 (kg per step) of the grid import in emissions_arr, and in
+        avoided_emissions_arr what the site saves against drawing all its served load
+        from the grid: solar used on site, exports (displacing grid generation) and
+        battery shifting between cleaner and dirtier hours. day_index as in apply_energy_tariff.
+        """
+        grid_import = sim_data["grid_import_arr"]
+        factors = EmissionsLibrary.factors(config, grid_import.shape[-1], dt, day_index).astype(grid_import.dtype, copy=False)
+        served = sim_data["demand_arr"] - sim_data.get("unserved_arr", 0)
+        sim_data["emissions_arr"] = grid_import * factors
+        sim_data["avoided_emissions_arr"] = (served - grid_import + sim_data["solar_sold_arr"]) * factors
+
+    @staticmethod
+    def daily_totals(sim_data: dict) -> Dict[str, float]:
+        """
+        Reduce simulated site arrays to totals.
+        """
+        unserved = float(np.sum(sim_data["unserved_arr"])) if "unserved_arr" in sim_data else 0.0
+        delayed = float(np.sum(sim_data["delayed_arr"])) if "delayed_arr" in sim_data else 0.0
+        return {
+            "solar_produced": float(np.sum(sim_data["solar_total_arr"])),
+            "grid_imported": float(np.sum(sim_data["grid_import_arr"])),
+            "solar_exported": float(np.sum(sim_data["solar_sold_arr"])),
+            "solar_curtailed": float(np.sum(sim_data["curtailed_arr"])),
+            "revenue": float(np.sum(sim_data["revenue_arr"])),
+            "export_revenue": float(np.sum(sim_data["export_revenue_arr"])),
+            "operating_cost": float(np.sum(sim_data["cost_grid_arr"]) + np.sum(sim_data["cost_battery_arr"])),
+            "energy_delivered": float(np.sum(sim_data["demand_arr"])) - unserved,
+            "energy_unserved": unserved,
+            "energy_delayed": delayed,
+            "emissions_kg": float(np.sum(sim_data["emissions_arr"])) if "emissions_arr" in sim_data else 0.0,
+            "avoided_emissions_kg": float(np.sum(sim_data["avoided_emissions_arr"])) if "avoided_emissions_arr" in sim_data else 0.0,
+        }
+
+    @staticmethod
+    def resolve_config(config: SimulationConfig) -> SimulationConfig:
+        """
+        Config with its library tariff and catalog products applied; every simulation
+        entry point starts here.
+        """
+        return TariffLibrary.resolve_config(ComponentCatalog.resolve_config(config))
+
+    @staticmethod
+    def run_full_simulation(config: SimulationConfig) -> SimulationResult:
+        config = CalculatorService.resolve_config(config)
+        # Simulate all stations of the site jointly
+        sim_data = CalculatorService.simulate_site_day(config)
+        dt = config.time_resolution_minutes / 60.0
+        CalculatorService.apply_energy_tariff(config, sim_data, dt)
+        CalculatorService.apply_emissions(config, sim_data, dt)
         
         # Aggregate totals (daily)
-        total_solar = np.sum(sim_data["solar_total_arr"]) * n
-        total_grid = np.sum(sim_data["grid_import_arr"]) * n
-        total_revenue = np.sum(sim_data["revenue_arr"]) * n
-        total_operating_cost = (np.sum(sim_data["cost_grid_arr"]) + np.sum(sim_data["cost_battery_arr"])) * n
-        total_energy = np.sum(sim_data["demand_arr"]) * n
+        totals = CalculatorService.daily_totals(sim_data)
+        total_revenue = totals["revenue"]
+        total_operating_cost = totals["operating_cost"]
+        
+        # Demand charges: the simulated day stands for every month
+        peaks = TariffService.monthly_peaks(config, sim_data["grid_import_arr"], dt)
+        annual_demand_charges = float(TariffService.demand_charges(config, peaks["peak_kw"], peaks["tou_peak_kw"])[0]) * 12
         
         # Annualize
         annual_revenue = total_revenue * 365
-        annual_operating_cost = total_operating_cost * 365
+        annual_operating_cost = total_operating_cost * 365 + annual_demand_charges
         capital_cost = CalculatorService.compute_infrastructure_cost(config)
-        # 10 year depreciation roughly
-        annual_depreciation = capital_cost / 10.0 
+        # Straight-line over each component's lifetime
+        annual_depreciation = FinanceService.annual_depreciation(config)
         net_profit = annual_revenue - annual_operating_cost - annual_depreciation
         
         roi = 0.0
@@ -222,21 +613,162 @@ class CalculatorService:
              "total_capital_cost": capital_cost,
              "annual_revenue": annual_revenue,
              "annual_operating_cost": annual_operating_cost,
+             "annual_demand_charges": annual_demand_charges,
              "net_profit": net_profit,
              "roi": roi,
-             "payback_years": capital_cost / (annual_revenue - annual_operating_cost) if (annual_revenue - annual_operating_cost) > 0 else -1
+             "payback_years": capital_cost / (annual_revenue - annual_operating_cost) if (annual_revenue - annual_operating_cost) > 0 else -1,
+             "annual_depreciation": annual_depreciation,
+             # Share of the solar output used on site, and of the load not drawn from the grid
+             "self_consumption_ratio": float(np.sum(sim_data["solar_used_arr"]) + np.sum(sim_data["solar_to_battery_arr"])) / totals["solar_produced"] if totals["solar_produced"] > 0 else 0.0,
+             "self_sufficiency_ratio": 1 - totals["grid_imported"] / totals["energy_delivered"] if totals["energy_delivered"] > 0 else 0.0,
+             **FinanceService.summary(config, annual_revenue, annual_operating_cost),
         }
+        annual_avoided_t = totals["avoided_emissions_kg"] * 365 / 1000
+        roi_metrics["annual_emissions_t"] = totals["emissions_kg"] * 365 / 1000
+        roi_metrics["annual_avoided_emissions_t"] = annual_avoided_t
+        roi_metrics["cost_per_tonne_avoided"] = FinanceService.abatement_cost(config, roi_metrics["npv"], annual_avoided_t)
+        if config.financing is not None:
+            financed = FinanceService.evaluate_financing([config], [annual_revenue], [annual_operating_cost], [config.financing])
+            roi_metrics["financing"] = {
+                "monthly_payment": float(financed["monthly_payment"][0, 0]),
+                "financing_cost": float(financed["financing_cost"][0, 0]),
+                "npv": float(financed["npv"][0, 0]),
+                "payback_years": float(financed["payback_years"][0, 0]),
+                "min_monthly_cash_flow": float(financed["min_monthly_cash_flow"][0, 0]),
+                "monthly_cash_flows": financed["monthly_cash_flows"][:, 0, 0].tolist(),
+            }
         
         daily = {
-            "solar_produced": total_solar,
-            "grid_imported": total_grid,
-            "revenue": total_revenue
+            "solar_produced": totals["solar_produced"],
+            "grid_imported": totals["grid_imported"],
+            "solar_exported": totals["solar_exported"],
+            "solar_curtailed": totals["solar_curtailed"],
+            "revenue": total_revenue,
+            "export_revenue": totals["export_revenue"],
+            "energy_unserved": totals["energy_unserved"],
+            "energy_delayed": totals["energy_delayed"],
+            "emissions_kg": totals["emissions_kg"],
+            "avoided_emissions_kg": totals["avoided_emissions_kg"],
         }
         
         return SimulationResult(
-            daily=daily,
+            daily={**daily, "peak_import_kw": float(np.max(sim_data["grid_import_arr"]) / dt), "peak_demand_kw": float(peaks["peak_kw"][0])},
             monthly={k: v * 30 for k,v in daily.items()},
             yearly={k: v * 365 for k,v in daily.items()},
             annual_summary=roi_metrics, # duplicative but helpful structure
             roi_metrics=roi_metrics
         )
+
+    # --- Streaming jobs ---
+    # These generators yield one record as soon as it is computed so the API can
+    # stream NDJSON without holding the whole sweep / year in memory.
+
+    @staticmethod
+    def iter_sweep(base_config: SimulationConfig, scenarios: List[Dict[str, Any]]) -> Iterator[dict]:
+        """
+        Yields one record per scenario. Each scenario is base_config with its overrides applied.
+        Invalid scenarios yield an error record instead of aborting the whole sweep.
+        """
+        base = base_config.dict()
+        for index, overrides in enumerate(scenarios):
+            try:
+                config = SimulationConfig(**{**base, **overrides})
+                result = CalculatorService.run_full_simulation(config)
+            except Exception as e:
+                yield {"type": "error", "index": index, "overrides": overrides, "detail": str(e)}
+                continue
+            yield {"type": "scenario", "index": index, "overrides": overrides, "result": result.dict()}
+
+    @staticmethod
+    def financing_sweep(base_config: SimulationConfig, scenarios: List[Dict[str, Any]], offers: List[FinancingOption]) -> List[dict]:
+        """
+        Simulates each scenario once, then evaluates every financing offer against
+        every scenario in one batched call. One record per (scenario, offer).
+        """
+        base = base_config.dict()
+        # Resolve catalog products and library tariffs up front so the financed
+        # capital cost matches the one run_full_simulation reports
+        configs = [CalculatorService.resolve_config(SimulationConfig(**{**base, **overrides})) for overrides in scenarios]
+        results = [CalculatorService.run_full_simulation(c).roi_metrics for c in configs]
+        financed = FinanceService.evaluate_financing(
+            configs, [r["annual_revenue"] for r in results], [r["annual_operating_cost"] for r in results], offers
+        )
+        keys = ["monthly_payment", "financing_cost", "npv", "payback_years", "min_monthly_cash_flow"]
+        return [
+            {
+                "scenario": j,
+                "overrides": overrides,
+                "offer": i,
+                "offer_name": offer.name,
+                "capital_cost": results[j]["total_capital_cost"],
+                **{k: float(financed[k][i, j]) for k in keys},
+            }
+            for j, overrides in enumerate(scenarios)
+            for i, offer in enumerate(offers)
+        ]
+
+    @staticmethod
+    def iter_annual(config: SimulationConfig, days: int = 365, chunk_days: int = 30, seed: int = 42) -> Iterator[dict]:
+        """
+        Simulates `days` consecutive days as one continuous series (battery state and
+        the load-shifting backlog are carried across days and chunks) and yields one aggregated record per chunk
+        of `chunk_days`, then a final summary. Only one chunk is held in memory.
+        """
+        config = CalculatorService.resolve_config(config)
+        keys = ["solar_produced", "grid_imported", "solar_exported", "solar_curtailed", "revenue", "export_revenue",
+                "operating_cost", "energy_delivered", "energy_unserved", "energy_delayed", "emissions_kg", "avoided_emissions_kg"]
+        annual = dict.fromkeys(keys, 0.0)
+        dt = config.time_resolution_minutes / 60.0
+        rng = np.random.default_rng(seed)
+        soc = None
+        backlog = None
+        month_to_date = 0.0 # Block pricing: import (and residential load) billed so far in the current month
+        # Monthly maximum demand, merged across chunks
+        peak_kw = np.zeros(12)
+        tou_peak_kw = np.zeros(12)
+        billed_months = np.zeros(12, dtype=bool)
+        
+        for start in range(0, days, chunk_days):
+            end = min(start + chunk_days, days)
+            # Backlog still queued at a chunk boundary is served in the next chunk, not lost
+            sim_data = CalculatorService.simulate_period(
+                config, end - start, rng, dt, day_index=start, initial_soc=soc, initial_backlog=backlog, carry_backlog=end < days,
+            )
+            soc = sim_data["battery_soc_arr"][-1]
+            backlog = sim_data.get("station_backlog")
+            month_to_date = CalculatorService.apply_energy_tariff(config, sim_data, dt, start, month_to_date)
+            CalculatorService.apply_emissions(config, sim_data, dt, start)
+            if MONTH_OF_DAY[end % 365] != MONTH_OF_DAY[(end - 1) % 365]:
+                month_to_date = 0.0
+            
+            peaks = TariffService.monthly_peaks(config, sim_data["grid_import_arr"], dt, day_index=start)
+            np.maximum.at(peak_kw, peaks["months"], peaks["peak_kw"])
+            np.maximum.at(tou_peak_kw, peaks["months"], peaks["tou_peak_kw"])
+            billed_months[peaks["months"]] = True
+            
+            chunk = CalculatorService.daily_totals(sim_data)
+            for k in keys:
+                annual[k] += chunk[k]
+            yield {"type": "chunk", "start_day": start, "days": end - start, **chunk, "peak_demand_kw": float(peaks["peak_kw"].max())}
+            
+        demand_charges = float(TariffService.demand_charges(config, peak_kw, tou_peak_kw)[billed_months].sum())
+
+        capital_cost = CalculatorService.compute_infrastructure_cost(config)
+        # Scale to a 365 day year so partial runs stay comparable
+        year_factor = 365.0 / days
+        annual_net = (annual["revenue"] - annual["operating_cost"] - demand_charges) * year_factor
+        lifetime = FinanceService.summary(
+            config, annual["revenue"] * year_factor, (annual["operating_cost"] + demand_charges) * year_factor
+        )
+        yield {
+            "type": "summary",
+            "days": days,
+            **annual,
+            "demand_charges": demand_charges,
+            "monthly_peak_kw": peak_kw[billed_months].tolist(),
+            "total_capital_cost": capital_cost,
+            "payback_years": capital_cost / annual_net if annual_net > 0 else -1,
+            **lifetime,
+            "annual_avoided_emissions_t": annual["avoided_emissions_kg"] * year_factor / 1000,
+            "cost_per_tonne_avoided": FinanceService.abatement_cost(config, lifetime["npv"], annual["avoided_emissions_kg"] * year_factor / 1000),
+        }
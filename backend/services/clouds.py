@@ -0,0 +1,123 @@
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+import numpy as np
+from services.solar import SolarGeometry
+from services.tariffs import MONTH_OF_DAY
+from services.weather import WeatherLibrary, GHI
+
+# Day-level sky states and the daily clear-sky index separating them
+CLOUD_STATES = ["overcast", "mixed", "clear"]
+STATE_THRESHOLDS = [0.45, 0.7]
+KC_MAX = 1.2
+# Hours with less clear-sky irradiance than this are left out of the fit (dawn / dusk noise)
+MIN_CLEAR_SKY = 50.0
+
+# Used when the weather library has no site to fit on (tropical monsoon climate)
+DEFAULT_CLOUD_PARAMS = {
+    "transition": np.tile(np.array([[0.45, 0.4, 0.15], [0.2, 0.5, 0.3], [0.1, 0.3, 0.6]]), (12, 1, 1)),
+    "stationary": np.tile(np.array([0.25, 0.4, 0.35]), (12, 1)),
+    "mean": np.array([0.3, 0.58, 0.78]),
+    "std": np.array([0.12, 0.14, 0.08]),
+    "phi": 0.7,
+}
+
+class CloudModel:
+    """
+    Stochastic clear-sky index (kc = irradiance / clear-sky irradiance) per step.
+
+    Each day is overcast, mixed or clear; consecutive days follow a monthly Markov
+    chain, independent days are drawn from the monthly state frequencies. Within a
+    day kc is the state's mean plus an AR(1) deviation with the state's spread,
+    so cloudy hours cluster instead of flickering step to step.
+    """
+
+    @staticmethod
+    @lru_cache(maxsize=8)
+    def fit(site_ids: Tuple[str, ...]) -> Dict[str, np.ndarray]:
+        """
+        Parameters from the hourly GHI of library sites against Haurwitz clear sky.
+        Counts are Laplace-smoothed so every month has a proper chain.
+        """
+        states = len(CLOUD_STATES)
+        transitions = np.ones((12, states, states))
+        frequencies = np.ones((12, states))
+        kc_by_state = [[] for _ in range(states)]
+        lag_pairs = []
+        for site_id in site_ids:
+            site = WeatherLibrary.get(site_id)
+            ghi = WeatherLibrary.load(site_id)[:, GHI].astype(np.float64).reshape(365, 24)
+            clear = SolarGeometry.clear_sky(site["latitude"], site["longitude"], site["timezone"] or 0.0).reshape(365, 24)
+            daylight = clear > MIN_CLEAR_SKY
+            daily_kc = np.where(daylight, ghi, 0).sum(axis=1) / np.where(daylight, clear, 0).sum(axis=1)
+            day_state = np.digitize(daily_kc, STATE_THRESHOLDS)
+
+            np.add.at(frequencies, (MONTH_OF_DAY, day_state), 1)
+            np.add.at(transitions, (MONTH_OF_DAY[:-1], day_state[:-1], day_state[1:]), 1)
+            kc = np.where(daylight, np.minimum(ghi / np.maximum(clear, 1.0), KC_MAX), np.nan)
+            for s in range(states):
+                kc_by_state[s].append(kc[day_state == s][daylight[day_state == s]])
+            lag_pairs.append((kc, day_state))
+
+        kc_all = [np.concatenate(values) if values else np.empty(0) for values in kc_by_state]
+        defaults = DEFAULT_CLOUD_PARAMS
+        mean = np.array([v.mean() if v.size > 24 else defaults["mean"][s] for s, v in enumerate(kc_all)])
+        std = np.array([v.std() if v.size > 24 else defaults["std"][s] for s, v in enumerate(kc_all)])
+        # Lag-1 autocorrelation of the hourly deviation from the day's state mean, within days
+        prev, curr = [], []
+        for kc, day_state in lag_pairs:
+            dev = (kc - mean[day_state][:, None]) / std[day_state][:, None]
+            pair = ~np.isnan(dev[:, :-1]) & ~np.isnan(dev[:, 1:])
+            prev.append(dev[:, :-1][pair])
+            curr.append(dev[:, 1:][pair])
+        prev, curr = np.concatenate(prev), np.concatenate(curr)
+        phi = float(np.clip(np.corrcoef(prev, curr)[0, 1], 0.0, 0.99)) if prev.size > 24 else defaults["phi"]
+
+        return {
+            "transition": transitions / transitions.sum(axis=-1, keepdims=True),
+            "stationary": frequencies / frequencies.sum(axis=-1, keepdims=True),
+            "mean": mean,
+            "std": std,
+            "phi": phi,
+        }
+
+    @staticmethod
+    def default() -> Dict[str, np.ndarray]:
+        """
+        Fit over every library site with coordinates, else DEFAULT_CLOUD_PARAMS.
+        """
+        sites = tuple(sorted(site_id for site_id, site in WeatherLibrary.sites().items() if site["latitude"] is not None))
+        return CloudModel.fit(sites) if sites else DEFAULT_CLOUD_PARAMS
+
+    @staticmethod
+    def day_states(params: Dict[str, np.ndarray], n: int, rng: np.random.Generator, day_index: Optional[int] = None) -> np.ndarray:
+        """
+        Sky state of n random days, or of n consecutive days from `day_index` (Markov chain).
+        """
+        u = rng.random(n)
+        if day_index is None:
+            months = MONTH_OF_DAY[rng.integers(0, 365, n)]
+            return (u[:, None] > np.cumsum(params["stationary"][months], axis=-1)[:, :-1]).sum(axis=1)
+        months = MONTH_OF_DAY[(day_index + np.arange(n)) % 365]
+        cumulative = np.cumsum(params["transition"], axis=-1)
+        states = np.empty(n, dtype=np.int64)
+        states[0] = (u[0] > np.cumsum(params["stationary"][months[0]])[:-1]).sum()
+        for d in range(1, n):
+            states[d] = (u[d] > cumulative[months[d], states[d - 1], :-1]).sum()
+        return states
+
+    @staticmethod
+    def sample(params: Dict[str, np.ndarray], n: int, steps_per_day: int, dt: float, rng: np.random.Generator,
+               day_index: Optional[int] = None, dtype=np.float64) -> np.ndarray:
+        """
+        Clear-sky index, shape (n, steps_per_day). The hourly AR coefficient is scaled
+        to the step length (phi ** dt), so the correlation time does not depend on the resolution.
+        """
+        states = CloudModel.day_states(params, n, rng, day_index)
+        phi = params["phi"] ** dt
+        shocks = rng.standard_normal((n, steps_per_day)) * np.sqrt(1 - phi ** 2)
+        deviation = np.empty((n, steps_per_day))
+        deviation[:, 0] = shocks[:, 0] / np.sqrt(1 - phi ** 2) if phi < 1 else 0.0
+        for t in range(1, steps_per_day):
+            deviation[:, t] = phi * deviation[:, t - 1] + shocks[:, t]
+        kc = params["mean"][states][:, None] + params["std"][states][:, None] * deviation
+        return np.clip(kc, 0.0, KC_MAX).astype(dtype, copy=False)
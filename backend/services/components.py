@@ -0,0 +1,162 @@
+import json
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional, Tuple
+import numpy as np
+from db.session import SessionLocal
+# All models, so the relationship mappers also configure outside the app (scripts)
+from models import user, inventory, quote, analytics
+from models.inventory import ProductModel
+from schemas.simulation import SimulationConfig
+
+# Spec field -> accepted keys, first match wins. The catalog's validated schemas
+# (schemas/inventory.py) use the first name; older and seeded products the others.
+SPEC_ALIASES = {
+    "solar_panel": {
+        "wattage": ("wattage", "power_w"),
+    },
+    "battery": {
+        "capacity_kwh": ("capacity_kwh",),
+        "max_discharge_kw": ("max_discharge_kw", "max_power_kw"),
+        "voltage_nominal": ("voltage_nominal", "voltage"),
+    },
+    "inverter": {
+        "rated_power_kw": ("rated_power_kw", "max_output_kw"),
+        "efficiency": ("efficiency",),
+    },
+}
+# Used when an optional spec is missing (BatterySpecs default voltage, 0.5C discharge)
+DEFAULT_VOLTAGE = 48.0
+DEFAULT_C_RATE = 0.5
+
+class ComponentBundle:
+    """
+    Simulation numbers of one system's catalog products (panel, battery, inverter),
+    compiled from their specs JSON. Plain floats in slots: reading them in the
+    sizing loop is an attribute access, not a dict lookup plus a unit conversion.
+    Fields of a component type the bundle has no product for are None.
+    """
+    __slots__ = ("product_ids", "panel_kw", "battery_kwh", "battery_voltage", "battery_max_kw", "inverter_kw", "inverter_efficiency")
+
+    def __init__(self, product_ids: Tuple[int, ...], panel_kw: Optional[float] = None, battery_kwh: Optional[float] = None,
+                 battery_voltage: Optional[float] = None, battery_max_kw: Optional[float] = None,
+                 inverter_kw: Optional[float] = None, inverter_efficiency: Optional[float] = None):
+        self.product_ids = product_ids
+        self.panel_kw = panel_kw
+        self.battery_kwh = battery_kwh
+        self.battery_voltage = battery_voltage
+        self.battery_max_kw = battery_max_kw
+        self.inverter_kw = inverter_kw
+        self.inverter_efficiency = inverter_efficiency
+
+    def battery_power_kw(self, batteries):
+        """
+        Charge / discharge power of `batteries` units (scalar or array), capped by the inverter.
+        """
+        power = np.asarray(batteries) * self.battery_max_kw
+        return power if self.inverter_kw is None else np.minimum(power, self.inverter_kw)
+
+    def overrides(self, panels: Optional[int] = None, batteries: Optional[int] = None) -> Dict[str, Any]:
+        """
+        SimulationConfig fields for this bundle: one battery unit per pack, and with
+        counts given the array size and the battery power of that many units.
+        """
+        update = {}
+        if self.battery_kwh is not None:
+            update["battery_pack_voltage"] = self.battery_voltage
+            update["battery_pack_Ah"] = self.battery_kwh * 1000.0 / self.battery_voltage
+            if batteries is not None:
+                update["number_of_battery_packs"] = int(batteries)
+                update["battery_max_charge_power"] = float(self.battery_power_kw(max(batteries, 1)))
+        if self.inverter_efficiency is not None:
+            update["inverter_efficiency"] = self.inverter_efficiency
+        if self.panel_kw is not None and panels is not None:
+            update["solar_capacity"] = panels * self.panel_kw
+        return update
+
+class ComponentCatalog:
+    """
+    Compiles catalog ProductModels (anything with id, type and specs) to ComponentBundles.
+
+    ProductModel rows have no version column, so a product is keyed by its id and
+    its canonical specs JSON: an unchanged product is compiled once per process,
+    an edited one compiles fresh. Bundles are cached on the set of product keys.
+    """
+
+    @staticmethod
+    def product_key(product) -> Tuple[int, str, str]:
+        component_type = getattr(product.type, "value", product.type)
+        return product.id, component_type, json.dumps(product.specs, sort_keys=True, separators=(",", ":"))
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def compile_product(product_id: int, component_type: str, specs_json: str) -> Dict[str, float]:
+        """
+        Typed fields of one product, aliases resolved. Raises ValueError when a
+        required spec (panel wattage, battery capacity, inverter power) is missing.
+        """
+        if component_type not in SPEC_ALIASES:
+            return {}
+        specs = json.loads(specs_json)
+        fields = {}
+        for field, keys in SPEC_ALIASES[component_type].items():
+            value = next((specs[k] for k in keys if specs.get(k) is not None), None)
+            if value is not None:
+                fields[field] = float(value)
+
+        required = {"solar_panel": "wattage", "battery": "capacity_kwh", "inverter": "rated_power_kw"}[component_type]
+        if required not in fields:
+            raise ValueError(f"Product {product_id} ({component_type}) has no '{required}' spec")
+        if component_type == "battery":
+            fields.setdefault("voltage_nominal", DEFAULT_VOLTAGE)
+            fields.setdefault("max_discharge_kw", DEFAULT_C_RATE * fields["capacity_kwh"])
+        return fields
+
+    @staticmethod
+    def load(product_ids: Iterable[int]) -> ComponentBundle:
+        """
+        Bundle of catalog products by id. Only the rows are read; their specs are
+        compiled once and then served from the caches. Raises ValueError for unknown ids.
+        """
+        product_ids = set(product_ids)
+        with SessionLocal() as db:
+            products = db.query(ProductModel).filter(ProductModel.id.in_(product_ids)).all()
+        missing = product_ids - {p.id for p in products}
+        if missing:
+            raise ValueError(f"Unknown product ids: {sorted(missing)}")
+        return ComponentCatalog.bundle(products)
+
+    @staticmethod
+    def resolve_config(config: SimulationConfig) -> SimulationConfig:
+        """
+        Config with the numbers of its catalog products (product_ids) filled in:
+        battery unit size and power for number_of_battery_packs units, inverter
+        efficiency and, with panel_count, the array size.
+        """
+        if not config.product_ids:
+            return config
+        bundle = ComponentCatalog.load(config.product_ids)
+        return config.copy(update=bundle.overrides(config.panel_count, config.number_of_battery_packs))
+
+    @staticmethod
+    def bundle(products: Iterable[Any]) -> ComponentBundle:
+        return ComponentCatalog.compile_bundle(tuple(sorted(ComponentCatalog.product_key(p) for p in products)))
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def compile_bundle(keys: Tuple[Tuple[int, str, str], ...]) -> ComponentBundle:
+        """
+        One product per component type; with several, the last by id is used.
+        """
+        compiled = {key[1]: ComponentCatalog.compile_product(*key) for key in keys}
+        panel = compiled.get("solar_panel")
+        battery = compiled.get("battery")
+        inverter = compiled.get("inverter")
+        return ComponentBundle(
+            product_ids=tuple(key[0] for key in keys),
+            panel_kw=panel["wattage"] / 1000.0 if panel else None,
+            battery_kwh=battery["capacity_kwh"] if battery else None,
+            battery_voltage=battery["voltage_nominal"] if battery else None,
+            battery_max_kw=battery["max_discharge_kw"] if battery else None,
+            inverter_kw=inverter["rated_power_kw"] if inverter else None,
+            inverter_efficiency=inverter.get("efficiency") if inverter else None,
+        )
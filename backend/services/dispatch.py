@@ -0,0 +1,373 @@
+from typing import Optional
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from schemas.simulation import SimulationConfig
+
+# Discharge floor shared by all strategies (fraction of capacity)
+RESERVE_FRACTION = 0.2
+# Working memory of the optimal solver: a block of scenarios' policy and Bellman step,
+# and a slice of their move costs. Larger batches and horizons are solved in pieces.
+SOLVE_BLOCK_MB = 2
+
+def bounded_cumsum(x0, delta: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """
+    Solves s[t] = min(hi[t], max(lo[t], s[t-1] + delta[t])) with s[-1] = x0 along the last axis.
+    
+    Each step is a clip function x -> min(h, max(l, x + c)) and the composition of two
+    such functions is again one, so the recursion is an associative scan. It is done
+    with log2(T) vectorized doubling passes (Hillis-Steele) instead of T Python iterations.
+    """
+    c, l, h = delta.copy(), lo.copy(), hi.copy()
+    steps = c.shape[-1]
+    offset = 1
+    while offset < steps:
+        # Compose the function ending at t - offset (applied first) with the one ending at t
+        c1, l1, h1 = c[..., :-offset], l[..., :-offset], h[..., :-offset]
+        c2, l2, h2 = c[..., offset:], l[..., offset:], h[..., offset:]
+        new_h = np.minimum(h2, np.maximum(l2, h1 + c2))
+        new_l = np.minimum(new_h, np.maximum(l2, l1 + c2))
+        new_c = c1 + c2
+        c[..., offset:], l[..., offset:], h[..., offset:] = new_c, new_l, new_h
+        offset *= 2
+    x0 = np.asarray(x0, dtype=c.dtype)[..., None]
+    return np.minimum(h, np.maximum(l, x0 + c))
+
+def reserve_scan(soc0: np.ndarray, delta: np.ndarray, is_discharge: np.ndarray, reserve: float, capacity: float) -> np.ndarray:
+    """
+    SoC trajectory of a rule-based schedule: discharge steps stop at the reserve,
+    charge steps stop at capacity. Below the reserve a discharge step is a no-op;
+    that only happens until the battery is first charged above it.
+    """
+    dtype = delta.dtype
+    lo = np.where(is_discharge, reserve, -np.inf).astype(dtype)
+    hi = np.where(is_discharge, np.inf, capacity).astype(dtype)
+    below_reserve = soc0[..., None] + np.cumsum(np.where(is_discharge, 0, delta), axis=-1) < reserve
+    idle = is_discharge & below_reserve
+    delta = np.where(idle, 0, delta).astype(dtype)
+    lo[idle] = -np.inf
+    return bounded_cumsum(soc0, delta, lo, hi)
+
+def schedule_flows(config: SimulationConfig, remaining: np.ndarray, leftover_solar: np.ndarray, change: np.ndarray):
+    """
+    Splits a battery schedule (battery-side SoC change per step) into energy
+    delivered to the load, battery-side charge from solar and AC energy drawn
+    from the grid for charging.
+    """
+    discharged = np.minimum(np.maximum(-change, 0), remaining)
+    charge_ac = np.maximum(change, 0) / config.inverter_efficiency
+    solar_charge = np.minimum(charge_ac, leftover_solar)
+    return discharged, solar_charge * config.inverter_efficiency, charge_ac - solar_charge
+
+# --- Strategies ---
+# Every strategy exposes
+#   schedule(config, remaining, leftover_solar, rates, dt, soc0, capacity, max_power, import_limit) -> soc
+# where remaining / leftover_solar are the load and solar surplus after direct solar use
+# (kWh per step, time on the last axis, any batch shape), max_power is in kW and
+# import_limit in kWh per step (None = unlimited).
+
+class GreedyDispatch:
+    """
+    Self-consumption: leftover solar charges the battery, which then serves any
+    load left after solar down to the reserve. Never charges from the grid.
+    """
+
+    @staticmethod
+    def schedule(config: SimulationConfig, remaining, leftover_solar, rates, dt, soc0, capacity, max_power, import_limit=None):
+        is_discharge = remaining > 0
+        delta = np.where(is_discharge, -np.minimum(remaining, max_power * dt), leftover_solar * config.inverter_efficiency)
+        return reserve_scan(soc0, delta, is_discharge, RESERVE_FRACTION * capacity, capacity)
+
+def per_day(x: np.ndarray, dt: float, steps: int) -> np.ndarray:
+    """
+    View of `x` (time on the last axis, broadcast to `steps`) with the days on
+    their own axis: (..., days, steps per day). A horizon that is not whole days
+    is one "day".
+    """
+    steps_per_day = int(round(24 / dt))
+    if steps % steps_per_day:
+        steps_per_day = steps
+    return np.broadcast_to(x, x.shape[:-1] + (steps,)).reshape(x.shape[:-1] + (-1, steps_per_day))
+
+def grid_charge(config: SimulationConfig, remaining, leftover_solar, dt, max_power, allowed, room):
+    """
+    Battery-side grid charge per step: where `allowed`, energy up to `room` (kWh AC)
+    and the power left after charging the leftover solar.
+    """
+    if not config.battery_grid_charging:
+        return np.zeros_like(remaining)
+    solar = leftover_solar * config.inverter_efficiency
+    grid = np.minimum(np.maximum(room, 0) * config.inverter_efficiency, np.maximum(max_power * dt - solar, 0))
+    return np.where(allowed, grid, 0)
+
+class TouArbitrageDispatch:
+    """
+    Stored energy serves the load whenever the rate is above the charge-cost
+    threshold, the day's lowest rate over the inverter efficiency. The battery
+    stores leftover solar and, in the cheapest steps of days whose top rate
+    repays the round trip and wear, tops up from the grid: only what the day's
+    discharge steps need beyond its own solar surplus, so grid energy does not
+    take the room of the solar that follows.
+    Days with a flat rate behave like storing solar only.
+    """
+
+    @staticmethod
+    def schedule(config: SimulationConfig, remaining, leftover_solar, rates, dt, soc0, capacity, max_power, import_limit=None):
+        shape = remaining.shape
+        daily_rates = per_day(rates, dt, shape[-1])
+        daily_remaining = per_day(remaining, dt, shape[-1])
+        daily_solar = per_day(leftover_solar, dt, shape[-1]) * config.inverter_efficiency
+        low = daily_rates.min(axis=-1, keepdims=True)
+        charge_cost = low / config.inverter_efficiency
+
+        is_discharge = (daily_rates > charge_cost) & (daily_remaining > 0)
+        discharge = np.minimum(daily_remaining, max_power * dt)
+        needed = np.maximum(np.where(is_discharge, discharge, 0).sum(axis=-1, keepdims=True) - daily_solar.sum(axis=-1, keepdims=True), 0)
+
+        cheap = (daily_rates == low) & (daily_rates.max(axis=-1, keepdims=True) > charge_cost + config.battery_degradation_cost)
+        room = import_limit - daily_remaining if import_limit is not None else np.inf
+        grid = grid_charge(config, daily_remaining, daily_solar / config.inverter_efficiency, dt, max_power, cheap, room)
+        grid = np.diff(np.minimum(np.cumsum(grid, axis=-1), needed), axis=-1, prepend=0)
+
+        delta = np.where(is_discharge, -discharge, daily_solar + grid).reshape(shape).astype(remaining.dtype)
+        return reserve_scan(soc0, delta, is_discharge.reshape(shape), RESERVE_FRACTION * capacity, capacity)
+
+class PeakShavingDispatch:
+    """
+    Keeps grid import under a target at the least energy cost:
+    - above the target the battery covers the excess;
+    - what those steps cannot get from stored solar is topped up from the grid in
+      off-peak steps (at or below the day's median rate), as late as possible
+      before it is needed, so the top-up does not take the room of the solar;
+    - stored energy no later shaving step needs serves any other load, like greedy.
+    The target is peak_shaving_target_kw, else the site import limit, else each
+    scenario's average import raised to its peak less the battery power (shaving
+    deeper cannot lower the peak). Without a demand charge, target or limit the
+    peak costs nothing and the schedule is greedy.
+    """
+
+    @staticmethod
+    def target(config: SimulationConfig, remaining, dt, max_power, import_limit=None):
+        if config.peak_shaving_target_kw is not None:
+            return config.peak_shaving_target_kw * dt
+        if import_limit is not None:
+            return import_limit
+        return np.maximum(remaining.mean(axis=-1, keepdims=True), remaining.max(axis=-1, keepdims=True) - max_power * dt)
+
+    @staticmethod
+    def schedule(config: SimulationConfig, remaining, leftover_solar, rates, dt, soc0, capacity, max_power, import_limit=None):
+        shape, dtype = remaining.shape, remaining.dtype
+        reserve = RESERVE_FRACTION * capacity
+        soc0 = np.broadcast_to(np.asarray(soc0, dtype=dtype), shape[:-1])
+        solar = leftover_solar * config.inverter_efficiency
+        billed = (config.demand_charge_rate > 0 or config.peak_demand_charge_rate > 0
+                  or config.peak_shaving_target_kw is not None or import_limit is not None)
+        target = PeakShavingDispatch.target(config, remaining, dt, max_power, import_limit) if billed else np.inf
+        above = remaining > target
+        shave = np.where(above, np.minimum(remaining - target, max_power * dt), 0)
+
+        # Shaving with stored solar only; its shortfall is what the grid top-up must supply
+        delta = np.where(above, -shave, solar).astype(dtype)
+        soc = reserve_scan(soc0, delta, above, reserve, capacity)
+        grid = np.zeros_like(remaining)
+        if billed and config.battery_grid_charging:
+            shortfall = np.where(above, shave + np.diff(soc, axis=-1, prepend=soc0[..., None]), 0)
+            daily_rates = per_day(rates, dt, shape[-1])
+            off_peak = (daily_rates <= np.median(daily_rates, axis=-1, keepdims=True)).reshape(daily_rates.shape[:-2] + (-1,))
+            top_up = np.broadcast_to(grid_charge(config, remaining, leftover_solar, dt, max_power, off_peak & ~above, target - remaining), shape)
+            # In reversed time the shortfalls are a backlog paid off by the top-up steps
+            # met on the way, the latest ones before each shortfall: a clipped running sum
+            owed = bounded_cumsum(0.0, np.flip(shortfall - top_up, axis=-1), np.zeros_like(remaining), np.full_like(remaining, np.inf))
+            owed_before = np.concatenate([np.zeros_like(owed[..., :1]), owed[..., :-1]], axis=-1)
+            grid = np.flip(np.clip(owed_before - owed + np.flip(shortfall, axis=-1), 0, np.flip(top_up, axis=-1)), axis=-1)
+            delta = np.where(above, -shave, solar + grid).astype(dtype)
+            soc = reserve_scan(soc0, delta, above, reserve, capacity)
+
+        # Energy the schedule can spare at t without starving a later shaving step,
+        # spare[t] = min(soc[t] - reserve, spare[t + 1] + overflow[t + 1]), where solar
+        # overflowing a full battery refills whatever was spent before: solved backwards
+        overflow = np.where(above, 0, np.maximum(np.concatenate([soc0[..., None], soc[..., :-1]], axis=-1) + delta - soc, 0))
+        refill = np.concatenate([np.zeros_like(overflow[..., :1]), np.flip(overflow, axis=-1)[..., :-1]], axis=-1)
+        spare = bounded_cumsum(np.inf, refill, np.full_like(refill, -np.inf), np.flip(soc - reserve, axis=-1))
+        floor = soc - np.maximum(np.flip(spare, axis=-1), 0)
+
+        # Every load step without a top-up discharges, shaving steps at least their shave
+        is_discharge = (remaining > 0) & (grid <= 0)
+        delta = np.where(is_discharge, -np.minimum(remaining, max_power * dt), solar + grid).astype(dtype)
+        lo = np.where(is_discharge, floor, -np.inf).astype(dtype)
+        hi = np.where(is_discharge, np.inf, capacity).astype(dtype)
+        return bounded_cumsum(soc0, delta, lo, hi)
+
+class OptimalDispatch:
+    """
+    Cost-optimal battery schedule for a known horizon (tariff, solar and demand),
+    by backward dynamic programming over `levels` SoC levels between the reserve
+    and full capacity.
+
+    A step moves the battery by a whole number of levels, within the power limit.
+    The cost of a move only depends on its size, so the Bellman update
+        V[t, i] = min_m cost[t, m] + V[t + 1, i + m]
+    is an infimal convolution of V with the move costs. When the move costs are
+    convex (non-negative rates, and unserved energy valued at least at the grid
+    rate) V stays convex, and the convolution is a merge of the two sorted slope
+    sequences: O(levels + moves) per step. Otherwise it is one add + argmin over a
+    (levels, moves) sliding window of V. Either way there is no loop over states,
+    and a block of scenarios is solved at once.
+    """
+
+    @staticmethod
+    def move_costs(config: SimulationConfig, net: np.ndarray, rates: np.ndarray, moves: np.ndarray, import_limit: Optional[float]) -> np.ndarray:
+        """
+        Cost of each battery move (kWh, battery side) in every step, shape (..., steps, moves).
+        `net` is demand minus solar (negative = surplus). Energy above the import
+        limit is not served and costs the lost charging revenue.
+        """
+        charge = np.maximum(moves, 0) / config.inverter_efficiency
+        discharge = np.maximum(-moves, 0)
+        grid_import = np.maximum(net[..., None] + charge - discharge, 0)
+        unserved = 0.0
+        if import_limit is not None:
+            unserved = np.maximum(grid_import - import_limit, 0)
+            grid_import = grid_import - unserved
+        cost = grid_import * rates[..., None] + unserved * config.charging_price + discharge * config.battery_degradation_cost
+        if not config.battery_grid_charging:
+            # Charging may only use the solar surplus
+            surplus = np.maximum(-net, 0)[..., None]
+            cost = np.where(charge > surplus + 1e-9, np.inf, cost)
+        return cost
+
+    @staticmethod
+    def step_bytes(levels: int, band: int, convex: bool) -> int:
+        """
+        Working memory of one Bellman step for one scenario: the sorted slopes and
+        their order, or the (levels, moves) window with its argmin.
+        """
+        moves = 2 * band + 1
+        return 48 * (levels + moves) if convex else 16 * levels * moves
+
+    @staticmethod
+    def solve(config: SimulationConfig, net: np.ndarray, rates: np.ndarray, dt: float, soc0: np.ndarray,
+              capacity: float, max_power: float, levels: int, import_limit: Optional[float] = None):
+        """
+        Returns the SoC trajectory, shaped like `net`. The scenarios are solved in
+        blocks whose policy and step working memory take half of SOLVE_BLOCK_MB, the
+        move costs the other half, so the footprint does not grow with the batch.
+        A battery that cannot hold or move energy keeps its initial SoC.
+        """
+        steps = net.shape[-1]
+        soc0 = np.broadcast_to(np.asarray(soc0, dtype=np.float64), net.shape[:-1])
+        if capacity <= 0 or max_power <= 0:
+            return np.broadcast_to(np.clip(soc0, 0, max(capacity, 0.0))[..., None], net.shape).copy()
+
+        ds = (capacity - RESERVE_FRACTION * capacity) / (levels - 1)
+        band = min(levels - 1, int(np.floor(max_power * dt / ds + 1e-9)))
+        # Move costs are convex in the move unless a rate is negative or unserved
+        # energy is cheaper than importing it
+        convex = bool(np.all(rates >= 0)) and (import_limit is None or bool(np.all(rates <= config.charging_price)))
+        per_scenario = 2 * steps * levels + OptimalDispatch.step_bytes(levels, band, convex)
+        block = max(1, SOLVE_BLOCK_MB * 2**20 // 2 // per_scenario)
+
+        flat_net = net.reshape(-1, steps)
+        flat_rates = np.broadcast_to(rates, net.shape).reshape(-1, steps)
+        flat_soc0 = soc0.reshape(-1)
+        soc = np.empty(flat_net.shape)
+        for first in range(0, flat_net.shape[0], block):
+            part = slice(first, first + block)
+            soc[part] = OptimalDispatch.solve_block(
+                config, flat_net[part], flat_rates[part], flat_soc0[part], capacity, ds, band, levels, convex, import_limit,
+            )
+        return soc.reshape(net.shape)
+
+    @staticmethod
+    def solve_block(config: SimulationConfig, net: np.ndarray, rates: np.ndarray, soc0: np.ndarray, capacity: float,
+                    ds: float, band: int, levels: int, convex: bool, import_limit: Optional[float] = None):
+        """
+        One block of solve(), shape (scenarios, steps). The start state is the level
+        nearest to soc0. Energy left at the end is valued at the cheapest rate of the
+        horizon (net of degradation), so the battery is not simply emptied on the
+        last step. The move costs are built a slice of steps at a time, and a window
+        too large for the budget is taken a slice of levels at a time.
+        """
+        n, steps = net.shape
+        budget = SOLVE_BLOCK_MB * 2**20 // 2
+        width = 2 * band + 1
+        span = max(1, budget // (n * 8 * 8 * width))
+        rows = min(levels, max(1, budget // (n * OptimalDispatch.step_bytes(1, band, False))))
+        reserve = RESERVE_FRACTION * capacity
+        moves = np.arange(-band, band + 1) * ds
+        scenario = np.arange(n)[:, None]
+
+        end_value = np.maximum(rates.min(axis=-1) - config.battery_degradation_cost, 0)
+        value = -(reserve + ds * np.arange(levels)) * end_value[:, None]
+        policy = np.empty((n, steps, levels), dtype=np.int16)
+        if convex:
+            # V is kept reversed in level. Its slopes are followed by the move-cost
+            # slopes, which are +inf past the feasible moves and so sort last. The
+            # leading column holds the value both sequences start from
+            value = value[:, ::-1].copy()
+            merged = np.empty((n, levels + 2 * band))
+            slopes = merged[:, 1:]
+            prefix = np.empty((n, levels + band))
+            taken = np.zeros((n, levels + band), dtype=np.int64)
+        else:
+            # V padded with +inf outside the SoC range, so window[:, i, m] = V[i + m - band]
+            padded = np.full((n, levels + 2 * band), np.inf)
+            window = sliding_window_view(padded, width, axis=-1)
+            flat = np.arange(n * rows) * width
+
+        for stop in range(steps, 0, -span):
+            first = max(0, stop - span)
+            costs = OptimalDispatch.move_costs(config, net[:, first:stop], rates[:, first:stop], moves, import_limit)
+            if convex:
+                with np.errstate(invalid="ignore"):
+                    cost_slopes = np.diff(costs, axis=-1)
+                cost_slopes[np.isnan(cost_slopes)] = np.inf
+            for t in range(stop - 1, first - 1, -1):
+                cost = costs[:, t - first]
+                if convex:
+                    # Reversed V[t] is reversed V[t + 1] convolved with cost: after the
+                    # first band + j merged slopes, q of them from cost, it is at level
+                    # levels - 1 - j, reached by a move of q - band. Both runs are sorted,
+                    # so the stable sort is a linear merge
+                    np.subtract(value[:, 1:], value[:, :-1], out=slopes[:, :levels - 1])
+                    slopes[:, levels - 1:] = cost_slopes[:, t - first]
+                    order = slopes.argsort(axis=-1, kind="stable")[:, :levels - 1 + band]
+                    slopes.sort(axis=-1)
+                    np.add(value[:, :1], cost[:, :1], out=merged[:, :1])
+                    np.add.accumulate(merged[:, :levels + band], axis=-1, out=prefix)
+                    np.add.accumulate(order >= levels - 1, axis=-1, dtype=np.int64, out=taken[:, 1:])
+                    value = prefix[:, band:]
+                    policy[:, t, ::-1] = taken[:, band:]
+                else:
+                    padded[:, band:band + levels] = value
+                    for low in range(0, levels, rows):
+                        total = window[:, low:low + rows] + cost[:, None, :]
+                        best = np.argmin(total, axis=-1)
+                        value[:, low:low + rows] = total.ravel()[flat[:best.size] + best.ravel()].reshape(best.shape)
+                        policy[:, t, low:low + rows] = best
+
+        # Follow the policy forward from the initial state. `position` indexes the
+        # flat policy at (scenario, t, level); a move of q - band goes to step t + 1
+        level = np.clip(np.rint((soc0 - reserve) / ds), 0, levels - 1).astype(np.int64)
+        position = scenario[:, 0] * steps * levels + level
+        flat_policy = policy.ravel()
+        chosen = np.empty((n, steps), dtype=np.int64)
+        for t in range(steps):
+            move = flat_policy.take(position)
+            chosen[:, t] = move
+            position += move
+            position += levels - band
+        chosen -= band
+
+        return np.clip(soc0[:, None] + np.cumsum(chosen * ds, axis=-1), 0, capacity)
+
+    @staticmethod
+    def schedule(config: SimulationConfig, remaining, leftover_solar, rates, dt, soc0, capacity, max_power, import_limit=None):
+        soc0 = np.asarray(soc0, dtype=np.float64)
+        return OptimalDispatch.solve(config, remaining - leftover_solar, rates, dt, soc0, capacity, max_power, config.dispatch_soc_levels, import_limit)
+
+DISPATCH_STRATEGIES = {
+    "greedy": GreedyDispatch,
+    "tou_arbitrage": TouArbitrageDispatch,
+    "peak_shaving": PeakShavingDispatch,
+    "optimal": OptimalDispatch,
+}
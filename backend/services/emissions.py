@@ -0,0 +1,89 @@
+import csv
+import json
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional
+import numpy as np
+from schemas.simulation import SimulationConfig
+from services.tariffs import TariffLibrary, MONTH_OF_DAY
+
+EMISSIONS_DIR = Path(__file__).resolve().parent.parent / "data" / "emissions"
+
+class EmissionsLibrary:
+    """
+    Grid carbon intensity (kg CO2 per kWh) per region, from files in data/emissions/,
+    compiled to a dense per-step array for the year like the tariffs.
+
+    JSON files:
+        {"id", "name", "default_factor", "monthly_factors": [12 values],
+         "periods": [{"months", "start", "end", "factor" or "scale"}, ...]}
+    CSV files hold only the periods, one per row, with the file name as id:
+        months,start,end,factor
+    monthly_factors replace default_factor month by month. A period applies to
+    `months` ("all", "6-9", ...) and the hours [start, end), which may wrap past
+    midnight; it sets the factor, or with `scale` multiplies the month's factor.
+    Later periods override earlier ones.
+    """
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def definitions() -> Dict[str, dict]:
+        regions = {}
+        for path in sorted(EMISSIONS_DIR.glob("*.json")):
+            with open(path) as f:
+                definition = json.load(f)
+            regions[definition.get("id", path.stem)] = definition
+        for path in sorted(EMISSIONS_DIR.glob("*.csv")):
+            with open(path, newline="") as f:
+                periods = list(csv.DictReader(f))
+            regions[path.stem] = {"id": path.stem, "name": path.stem, "periods": periods}
+        return regions
+
+    @staticmethod
+    def get(region: str) -> dict:
+        regions = EmissionsLibrary.definitions()
+        if region not in regions:
+            raise ValueError(f"Unknown emission_region '{region}', available: {sorted(regions)}")
+        return regions[region]
+
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def compile(region: str, resolution_minutes: int) -> np.ndarray:
+        """
+        Emission factor of every step of the 365-day year, read-only (shared).
+        """
+        definition = EmissionsLibrary.get(region)
+        monthly = np.asarray(definition.get("monthly_factors") or [definition.get("default_factor", 0.0)] * 12, dtype=np.float64)
+        steps_per_day = 1440 // resolution_minutes
+        hour = np.tile(np.arange(steps_per_day) * resolution_minutes / 60.0, 365)
+        month = np.repeat(MONTH_OF_DAY + 1, steps_per_day)
+
+        factors = monthly[month - 1]
+        for period in definition.get("periods", []):
+            start, end = float(period["start"]), float(period["end"])
+            in_hours = (hour >= start) & (hour < end) if start < end else (hour >= start) | (hour < end)
+            mask = in_hours & np.isin(month, TariffLibrary.parse_months(period.get("months")))
+            if period.get("scale") not in (None, ""):
+                factors[mask] = monthly[month[mask] - 1] * float(period["scale"])
+            else:
+                factors[mask] = float(period["factor"])
+
+        factors.setflags(write=False)
+        return factors
+
+    @staticmethod
+    def factors(config: SimulationConfig, steps: int, dt: float, day_index: Optional[int] = None) -> np.ndarray:
+        """
+        Emission factor of `steps` consecutive steps from day `day_index` (wrapping at
+        year end). With day_index None the series is a representative day: the
+        yearly average of each step of the day, repeated. Without an emission_region
+        the flat grid_emission_factor applies.
+        """
+        if config.emission_region is None:
+            return np.full(steps, config.grid_emission_factor)
+        compiled = EmissionsLibrary.compile(config.emission_region, int(round(dt * 60)))
+        steps_per_day = compiled.size // 365
+        if day_index is None:
+            return np.resize(compiled.reshape(365, steps_per_day).mean(axis=0), steps)
+        start = (day_index % 365) * steps_per_day
+        return np.take(compiled, np.arange(start, start + steps), mode="wrap")
@@ -0,0 +1,110 @@
+import heapq
+from collections import deque
+from typing import Optional
+import numpy as np
+from schemas.simulation import SimulationConfig
+
+class EVSessionSimulator:
+    """
+    Discrete-event simulation of EV charging sessions at one station.
+
+    Vehicles arrive as a (possibly time-varying) Poisson process, wait FIFO for one
+    of `ports_per_station` ports and balk if no port is free and `max_queue_length`
+    vehicles are already waiting (0: only vehicles finding a free port stay). Port release times live in a heap, so each arrival costs O(log ports).
+    """
+
+    @staticmethod
+    def sample_arrivals(config: SimulationConfig, days: int, rng: np.random.Generator) -> np.ndarray:
+        """
+        Sorted arrival times (hours from the start of day 0).
+        Poisson with `charging_sessions_per_day` vehicles per day on average; the
+        hour of day follows `arrival_hourly_profile` when given (empirical), else uniform.
+        """
+        count = rng.poisson(config.charging_sessions_per_day * days)
+        if config.arrival_hourly_profile:
+            weights = np.asarray(config.arrival_hourly_profile, dtype=np.float64)
+            hour_of_day = rng.choice(24, size=count, p=weights / weights.sum())
+            hours = rng.integers(0, days, size=count) * 24 + hour_of_day + rng.random(count)
+        else:
+            hours = rng.random(count) * days * 24
+        return np.sort(hours)
+
+    @staticmethod
+    def sample_energies(config: SimulationConfig, count: int, rng: np.random.Generator) -> np.ndarray:
+        """
+        Energy requested per session (kWh), gamma distributed with the configured mean / std.
+        """
+        mean, std = config.session_energy_mean_kwh, config.session_energy_std_kwh
+        if std <= 0:
+            return np.full(count, mean)
+        shape = (mean / std) ** 2
+        return rng.gamma(shape, mean / shape, size=count)
+
+    @staticmethod
+    def run_queue(arrivals: np.ndarray, durations: np.ndarray, ports: int, max_queue_length: Optional[int]):
+        """
+        FIFO multi-port queue. Returns start times (NaN for balked vehicles).
+        """
+        starts = np.full(arrivals.size, np.nan)
+        port_free = [0.0] * ports # heap of times at which each port is released
+        waiting = deque() # start times of accepted vehicles that have not started yet
+
+        for i, (arrival, duration) in enumerate(zip(arrivals.tolist(), durations.tolist())):
+            while waiting and waiting[0] <= arrival:
+                waiting.popleft()
+            # Balk only if the vehicle would have to wait and the queue is full
+            if max_queue_length is not None and port_free[0] > arrival and len(waiting) >= max_queue_length:
+                continue
+
+            start = max(arrival, port_free[0])
+            heapq.heapreplace(port_free, start + duration)
+            if start > arrival:
+                waiting.append(start)
+            starts[i] = start
+        return starts
+
+    @staticmethod
+    def load_profile(starts: np.ndarray, ends: np.ndarray, power: float, steps: int, dt: float) -> np.ndarray:
+        """
+        Energy drawn per step (kWh) by sessions charging at constant `power` on [start, end).
+        Uses the cumulative energy curve E(t) = power * sum(clip(t - start, 0, end - start)),
+        evaluated at step boundaries with sorted prefix sums, so it is exact for partial steps.
+        """
+        grid = np.arange(steps + 1) * dt
+
+        def ramp(times):
+            # sum over i of max(t - times[i], 0), for every t in grid
+            times = np.sort(times)
+            prefix = np.concatenate([[0.0], np.cumsum(times)])
+            k = np.searchsorted(times, grid)
+            return k * grid - prefix[k]
+
+        energy = power * (ramp(starts) - ramp(ends))
+        return np.diff(energy)
+
+    @staticmethod
+    def simulate(config: SimulationConfig, days: int, rng: np.random.Generator, dt: float = 0.5) -> dict:
+        """
+        Simulates `days` consecutive days at one station.
+        Returns the per-step load (kWh) plus session statistics.
+        """
+        arrivals = EVSessionSimulator.sample_arrivals(config, days, rng)
+        energies = EVSessionSimulator.sample_energies(config, arrivals.size, rng)
+        durations = energies / config.charging_station_power
+
+        starts = EVSessionSimulator.run_queue(arrivals, durations, config.ports_per_station, config.max_queue_length)
+        served = ~np.isnan(starts)
+        waits = starts[served] - arrivals[served]
+
+        steps = int(round(days * 24 / dt))
+        load = EVSessionSimulator.load_profile(starts[served], starts[served] + durations[served], config.charging_station_power, steps, dt)
+
+        return {
+            "load_arr": load,
+            "arrivals": int(arrivals.size),
+            "served": int(served.sum()),
+            "balked": int((~served).sum()),
+            "mean_wait_hours": float(waits.mean()) if waits.size else 0.0,
+            "energy_requested": float(energies.sum()),
+            "energy_delivered": float(load.sum()),
+        }
@@ -0,0 +1,299 @@
+from typing import Dict, List, Optional
+import numpy as np
+from schemas.simulation import SimulationConfig, FinancingOption
+
+# Config field holding the lifetime (years) of each capital cost component
+COMPONENT_LIFETIMES = {
+    "charging_stations": "charging_station_lifetime",
+    "transformer": "transformer_lifetime",
+    "solar_panels": "solar_panel_lifetime",
+    "inverters": "inverter_lifetime",
+    "installation": "installation_lifetime",
+    "battery": "battery_lifetime",
+}
+
+class FinanceService:
+    """
+    Project cash flows over config.project_years, as (years + 1, scenarios) arrays
+    with year 0 the initial investment. Every metric is a reduction over the year
+    axis, so evaluating many scenarios (or many financial assumptions) is a
+    handful of matrix operations.
+    """
+
+    @staticmethod
+    def infrastructure_costs(config: SimulationConfig) -> Dict[str, float]:
+        """
+        Capital cost per component; keys match COMPONENT_LIFETIMES.
+        """
+        # Calculate capital costs based on config
+        # A home has no transformer, and no charger unless EV load is included
+        residential = config.site_type == "residential"
+        station_cost = config.charging_station_cost * config.num_stations if not residential or config.include_ev_load else 0.0
+        transformer_cost = 0.0 if residential else config.transformer_cost
+        
+        inverter_unit_cost = config.inverter_cost if config.use_battery else 2000
+        inverter_cost = inverter_unit_cost * config.num_stations
+        
+        battery_cost = 0.0
+        if config.use_battery:
+            battery_cost = config.battery_pack_price * config.number_of_battery_packs * config.num_stations
+            
+        # Solar cost calculation from original code seemed to depend on capacity / 10 * price
+        # We'll use the provided total solar_panel_cost input as the base unit or calculate?
+        # The wizard inputs "Solar Panel Cost ($)" which seems to serve as a unit or total?
+        # In wizard.py: config["solar_panel_cost"] = solar_panel_cost (value=2000)
+        # In utils.py: solar_cost = (params.get("solar_capacity", 0) / 10) * SOLAR_PANEL_PRICE [if roi constants]
+        # or solar_cost = (params.get("solar_capacity", 0) / 10) * 1000 
+        
+        # Let's assume the input constraint: Cost per 10kW unit roughly
+        solar_cost = (config.solar_capacity / 10.0) * config.solar_panel_cost
+        install_cost = (config.solar_capacity / 10.0) * config.installation_cost
+        
+        return {
+            "charging_stations": station_cost,
+            "transformer": transformer_cost,
+            "solar_panels": solar_cost,
+            "inverters": inverter_cost,
+            "installation": install_cost,
+            "battery": battery_cost,
+        }
+
+    @staticmethod
+    def annual_depreciation(config: SimulationConfig) -> float:
+        """
+        Straight-line depreciation, each component over its own lifetime.
+        """
+        costs = FinanceService.infrastructure_costs(config)
+        return sum(cost / getattr(config, COMPONENT_LIFETIMES[k]) for k, cost in costs.items())
+
+    @staticmethod
+    def sample_assumptions(config: SimulationConfig, n: int, rng: Optional[np.random.Generator] = None) -> Dict[str, np.ndarray]:
+        """
+        Discount and escalation rates per scenario. With a generator and non-zero
+        spreads the rates are drawn around the configured values.
+        """
+        assumptions = {
+            "discount_rate": np.full(n, config.discount_rate),
+            "tariff_escalation": np.full(n, config.tariff_escalation),
+            "charging_price_escalation": np.full(n, config.charging_price_escalation),
+        }
+        if rng is not None:
+            if config.discount_rate_std:
+                assumptions["discount_rate"] += rng.normal(0, config.discount_rate_std, n)
+            if config.escalation_std:
+                assumptions["tariff_escalation"] += rng.normal(0, config.escalation_std, n)
+                assumptions["charging_price_escalation"] += rng.normal(0, config.escalation_std, n)
+        return assumptions
+
+    @staticmethod
+    def replacement_schedule(lifetimes: np.ndarray, years: int):
+        """
+        Installs per (year, component) and the salvage fraction of each component at
+        the end of the horizon. A component bought in year 0 is replaced every
+        `lifetime` years (rounded to whole years) until the last year; the life left
+        on the last unit is credited linearly as salvage.
+        """
+        life = np.maximum(np.rint(lifetimes), 1).astype(int)
+        year = np.arange(years + 1)[:, None]
+        installs = ((year % life == 0) & (year < years)).astype(np.float64)
+        last_install = (years - 1) // life * life
+        salvage = (life - (years - last_install)) / life
+        return installs, salvage
+
+    @staticmethod
+    def yearly_flows(config: SimulationConfig, annual_revenue, annual_operating_cost, assumptions: Dict[str, np.ndarray]):
+        """
+        Operating cash flow per (year, scenario) and capital spent per year.
+        Year-1 revenue and operating cost grow with their escalation rates (residential
+        revenue, an avoided bill, with the tariff); capital
+        is spent in year 0 and again for every replacement (at capex_escalation),
+        with salvage credited (negative investment) in the last year.
+        """
+        years = config.project_years
+        costs = FinanceService.infrastructure_costs(config)
+        capex = np.array([costs[k] for k in COMPONENT_LIFETIMES])
+        lifetimes = np.array([getattr(config, field) for field in COMPONENT_LIFETIMES.values()])
+        installs, salvage = FinanceService.replacement_schedule(lifetimes, years)
+
+        year = np.arange(years + 1)[:, None]
+        growth = lambda rate: (1 + rate) ** np.maximum(year - 1, 0) * (year > 0)
+        # A residential site's revenue is the grid cost it avoids
+        revenue_escalation = assumptions["tariff_escalation" if config.site_type == "residential" else "charging_price_escalation"]
+        revenue = np.asarray(annual_revenue, dtype=np.float64) * growth(revenue_escalation)
+        operating = np.asarray(annual_operating_cost, dtype=np.float64) * growth(assumptions["tariff_escalation"])
+
+        capex_escalation = (1 + config.capex_escalation) ** year[:, 0]
+        investment = installs @ capex * capex_escalation
+        investment[-1] -= salvage @ capex * capex_escalation[-1]
+        return revenue - operating, investment
+
+    @staticmethod
+    def cash_flows(config: SimulationConfig, annual_revenue, annual_operating_cost, assumptions: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        Net cash flow per (year, scenario) for a cash purchase.
+        """
+        operating, investment = FinanceService.yearly_flows(config, annual_revenue, annual_operating_cost, assumptions)
+        return operating - investment[:, None]
+
+    @staticmethod
+    def npv(flows: np.ndarray, rate) -> np.ndarray:
+        # Horner's scheme over the year axis: multiply-adds instead of powers
+        discount = 1 / (1 + np.asarray(rate, dtype=np.float64))
+        value = flows[-1]
+        for year in range(flows.shape[0] - 2, -1, -1):
+            value = value * discount + flows[year]
+        return value
+
+    @staticmethod
+    def irr(flows: np.ndarray, low: float = -0.99, high: float = 10.0, iterations: int = 50) -> np.ndarray:
+        """
+        Internal rate of return per scenario by bisection on all scenarios at once.
+        NaN where the NPV does not change sign on [low, high].
+        """
+        low = np.full(flows.shape[1], low)
+        high = np.full(flows.shape[1], high)
+        npv_low = FinanceService.npv(flows, low)
+        valid = np.sign(npv_low) != np.sign(FinanceService.npv(flows, high))
+        for _ in range(iterations):
+            mid = (low + high) / 2
+            npv_mid = FinanceService.npv(flows, mid)
+            same = np.sign(npv_mid) == np.sign(npv_low)
+            low, npv_low = np.where(same, mid, low), np.where(same, npv_mid, npv_low)
+            high = np.where(same, high, mid)
+        return np.where(valid, (low + high) / 2, np.nan)
+
+    @staticmethod
+    def discounted_payback(flows: np.ndarray, rate) -> np.ndarray:
+        """
+        Years until the cumulative discounted cash flow turns positive, interpolated
+        within the year; -1 where it never does within the horizon.
+        """
+        year = np.arange(flows.shape[0])[:, None]
+        discounted = flows / (1 + np.asarray(rate)) ** year
+        cumulative = np.cumsum(discounted, axis=0)
+        positive = cumulative >= 0
+        first = np.argmax(positive, axis=0)
+        found = positive.any(axis=0) & (first > 0)
+        columns = np.arange(flows.shape[1])
+        before = cumulative[np.maximum(first - 1, 0), columns]
+        step = discounted[first, columns]
+        payback = first - 1 + np.divide(-before, step, out=np.zeros_like(step), where=step > 0)
+        return np.where(found, payback, -1.0)
+
+    @staticmethod
+    def evaluate(config: SimulationConfig, annual_revenue, annual_operating_cost, assumptions: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, np.ndarray]:
+        """
+        NPV, IRR and discounted payback for each scenario, plus the cash flow matrix.
+        """
+        annual_revenue = np.atleast_1d(np.asarray(annual_revenue, dtype=np.float64))
+        if assumptions is None:
+            assumptions = FinanceService.sample_assumptions(config, annual_revenue.size)
+        flows = FinanceService.cash_flows(config, annual_revenue, annual_operating_cost, assumptions)
+        rate = assumptions["discount_rate"]
+        return {
+            "cash_flows": flows,
+            "npv": FinanceService.npv(flows, rate),
+            "irr": FinanceService.irr(flows),
+            "discounted_payback_years": FinanceService.discounted_payback(flows, rate),
+        }
+
+    @staticmethod
+    def summary(config: SimulationConfig, annual_revenue: float, annual_operating_cost: float) -> dict:
+        """
+        Lifetime metrics of a single scenario, JSON friendly (IRR None when undefined).
+        """
+        result = FinanceService.evaluate(config, annual_revenue, annual_operating_cost)
+        irr = float(result["irr"][0])
+        return {
+            "npv": float(result["npv"][0]),
+            "irr": None if np.isnan(irr) else irr,
+            "discounted_payback_years": float(result["discounted_payback_years"][0]),
+            "cash_flows": result["cash_flows"][:, 0].tolist(),
+        }
+
+    @staticmethod
+    def abatement_cost(config: SimulationConfig, npv: float, annual_tonnes: float) -> Optional[float]:
+        """
+        Net lifetime cost per tonne of CO2 avoided ($/t): -NPV over the discounted
+        tonnes of the project years. Negative when the project pays for itself.
+        """
+        if annual_tonnes <= 0:
+            return None
+        years = np.arange(1, config.project_years + 1)
+        return -npv / (annual_tonnes * float(np.sum((1 + config.discount_rate) ** -years)))
+
+    # --- Financing ---
+
+    @staticmethod
+    def financing_factors(offers: List[FinancingOption], months: int):
+        """
+        Cash flow per month of each offer per $1 of initial capex, shape (months + 1, offers),
+        and the monthly payment per $1. Loans pay the down payment upfront and a level
+        annuity on the rest (closed form); leases pay the down payment and a monthly
+        lease_rate of the capex; cash pays everything upfront.
+        """
+        kind = np.array([o.type for o in offers])
+        term = np.array([o.term_months for o in offers])
+        down = np.array([o.down_payment_fraction for o in offers])
+        r = np.array([o.apr for o in offers]) / 12
+        lease_rate = np.array([o.lease_rate for o in offers])
+
+        annuity = np.where(r > 0, r / (1 - (1 + r) ** -term.astype(np.float64)), 1 / term)
+        payment = np.where(kind == "loan", (1 - down) * annuity, np.where(kind == "lease", lease_rate, 0.0))
+        upfront = np.where(kind == "cash", 1.0, down)
+
+        month = np.arange(months + 1)[:, None]
+        factors = -payment * ((month >= 1) & (month <= term)) - upfront * (month == 0)
+        return factors, payment
+
+    @staticmethod
+    def evaluate_financing(configs: List[SimulationConfig], annual_revenue, annual_operating_cost, offers: List[FinancingOption]) -> Dict[str, np.ndarray]:
+        """
+        Monthly net-of-financing cash flows for every (offer, scenario) pair, shape
+        (months + 1, offers, scenarios), and per-pair metrics (offers, scenarios).
+        The initial investment is replaced by the offer's flows; replacements and
+        salvage stay with the owner. Operating cash flow is spread evenly over the
+        months of each year. Scenarios with a shorter horizon are zero padded.
+        """
+        yearly = [
+            FinanceService.yearly_flows(c, [rev], [cost], FinanceService.sample_assumptions(c, 1))
+            for c, rev, cost in zip(configs, annual_revenue, annual_operating_cost)
+        ]
+        years = max(c.project_years for c in configs)
+        operating = np.zeros((years + 1, len(configs)))
+        investment = np.zeros((years + 1, len(configs)))
+        for j, (op, inv) in enumerate(yearly):
+            operating[:op.shape[0], j] = op[:, 0]
+            investment[:inv.shape[0], j] = inv
+        capex = investment[0]
+
+        months = 12 * years
+        month = np.arange(months + 1)
+        operating_monthly = operating[(month - 1) // 12 + 1] / 12 * (month > 0)[:, None]
+        investment_monthly = np.zeros_like(operating_monthly)
+        investment_monthly[12 * np.arange(1, years + 1)] = investment[1:]
+
+        factors, payment = FinanceService.financing_factors(offers, months)
+        flows = (operating_monthly - investment_monthly)[:, None, :] + factors[:, :, None] * capex
+
+        discount_rate = np.array([c.discount_rate for c in configs])
+        discount = (1 + discount_rate) ** (-month[:, None] / 12)
+        cumulative = np.cumsum(flows, axis=0)
+        # Payback: when the cumulative cash position turns non-negative for good,
+        # interpolated within the month after the last negative one
+        negative = cumulative < 0
+        last_negative = months - np.argmax(negative[::-1], axis=0)
+        crossing = np.minimum(last_negative + 1, months)
+        before = np.take_along_axis(cumulative, last_negative[None], axis=0)[0]
+        step = np.take_along_axis(flows, crossing[None], axis=0)[0]
+        months_to_payback = last_negative + np.divide(-before, step, out=np.ones_like(step), where=step > 0)
+        payback = np.where(negative.any(axis=0), months_to_payback / 12, 0.0)
+        payback = np.where(negative[-1], -1.0, payback)
+        return {
+            "monthly_cash_flows": flows,
+            "monthly_payment": payment[:, None] * capex,
+            "financing_cost": (-factors.sum(axis=0)[:, None] - 1) * capex,
+            "npv": np.einsum("mos,ms->os", flows, discount),
+            "payback_years": payback,
+            "min_monthly_cash_flow": flows[1:].min(axis=0),
+        }
@@ -0,0 +1,87 @@
+from typing import Optional
+import numpy as np
+from schemas.simulation import SimulationConfig
+
+class LoadManager:
+    """
+    Shares the energy available in a step between stations when the site cap binds.
+    Requests are (..., stations) arrays and `available` is (...); every policy is a
+    handful of array operations across the station axis, with no per-station loop.
+    """
+
+    @staticmethod
+    def grid_limit_kw(config: SimulationConfig) -> Optional[float]:
+        """
+        Effective site import limit: the physical connection limit and/or the managed peak cap.
+        """
+        limits = [x for x in (config.site_import_limit_kw, config.site_power_cap_kw) if x is not None]
+        return min(limits) if limits else None
+
+    @staticmethod
+    def pro_rata(requests: np.ndarray, available: np.ndarray) -> np.ndarray:
+        total = requests.sum(axis=-1)
+        fraction = np.minimum(available / np.where(total > 0, total, 1), 1)
+        return requests * fraction[..., None]
+
+    @staticmethod
+    def equal_share(requests: np.ndarray, available: np.ndarray) -> np.ndarray:
+        """
+        Water-filling: every station gets min(request, level), with the level chosen so
+        the total equals `available`. Small requests are fully served first.
+        """
+        stations = requests.shape[-1]
+        d = np.sort(requests, axis=-1)
+        csum = np.cumsum(d, axis=-1)
+        # Total handed out if the level sits exactly at the k-th smallest request
+        totals = csum + d * (stations - 1 - np.arange(stations))
+        k = (totals < available[..., None]).sum(axis=-1)
+        served_before = np.where(k > 0, np.take_along_axis(csum, np.maximum(k - 1, 0)[..., None], axis=-1)[..., 0], 0)
+        level = (available - served_before) / np.maximum(stations - k, 1)
+        level = np.where(k >= stations, np.inf, level)
+        return np.minimum(requests, level[..., None])
+
+    @staticmethod
+    def ordered_fill(requests: np.ndarray, available: np.ndarray, order: np.ndarray) -> np.ndarray:
+        """
+        Serves stations fully in `order` (indices along the station axis) until `available` runs out.
+        """
+        ranked = np.take_along_axis(requests, order, axis=-1)
+        before = np.cumsum(ranked, axis=-1) - ranked
+        served_ranked = np.clip(available[..., None] - before, 0, ranked)
+        served = np.empty_like(requests)
+        np.put_along_axis(served, order, served_ranked, axis=-1)
+        return served
+
+    @staticmethod
+    def session_start(requests: np.ndarray) -> np.ndarray:
+        """
+        Step at which each station's current session started, requests shaped (..., steps, stations).
+        """
+        active = requests > 0
+        previous = np.concatenate([np.zeros_like(active[..., :1, :]), active[..., :-1, :]], axis=-2)
+        steps = np.arange(requests.shape[-2])[:, None]
+        return np.maximum.accumulate(np.where(active & ~previous, steps, 0), axis=-2)
+
+    @staticmethod
+    def allocate(config: SimulationConfig, requests: np.ndarray, available: np.ndarray, started: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Energy served per station. `started` is the session start step per station,
+        used by first-come-first-served.
+        """
+        policy = config.load_allocation_policy
+        if policy == "pro_rata":
+            return LoadManager.pro_rata(requests, available)
+        if policy == "equal_share":
+            return LoadManager.equal_share(requests, available)
+        if policy == "fcfs":
+            # Earliest session first; ties go to the lower station index (stable sort)
+            order = np.argsort(started, axis=-1, kind="stable")
+            return LoadManager.ordered_fill(requests, available, order)
+        if policy == "priority":
+            priorities = np.asarray(config.station_priorities if config.station_priorities is not None else np.zeros(requests.shape[-1]))
+            if priorities.size != requests.shape[-1]:
+                raise ValueError(f"station_priorities needs {requests.shape[-1]} entries, got {priorities.size}")
+            # Highest priority first
+            order = np.broadcast_to(np.argsort(-priorities, kind="stable"), requests.shape)
+            return LoadManager.ordered_fill(requests, available, order)
+        raise ValueError(f"Unknown load allocation policy: {policy}")
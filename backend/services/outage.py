@@ -0,0 +1,142 @@
+from typing import Tuple
+import numpy as np
+from schemas.simulation import SimulationConfig, OutageRequest
+from services.batch import StreamingStats, QuantileSketch
+from services.calculator import CalculatorService
+from services.dispatch import bounded_cumsum
+
+# Outages evaluated per array pass, (samples x longest outage of the chunk) arrays
+SAMPLES_PER_CHUNK = 2048
+# Unserved energy below this (kWh per step) is float noise
+UNSERVED_TOL = 1e-9
+
+OUTAGE_METRICS = [
+    "duration_hours",
+    "backup_hours",
+    "ev_demand_kwh",
+    "ev_unserved_kwh",
+    "load_unserved_kwh",
+    "unserved_without_battery_kwh",
+]
+
+class OutageSimulator:
+    """
+    Backup performance of the site during grid outages.
+
+    The site is simulated once over `days` consecutive days, which gives the load,
+    solar and battery state going into any outage. Outages are then sampled in
+    bulk and each one is evaluated on its window of that series: with the grid
+    gone, solar and the battery (down to empty, the dispatch reserve is there for
+    this) serve the household load first and the EV stations with what is left.
+    Every sample of a chunk goes through the same (samples, steps) array pass;
+    samples are sorted by duration first so a chunk is only as wide as its own
+    longest outage instead of the distribution's tail.
+    """
+
+    @staticmethod
+    def sample_outages(request: OutageRequest, n: int, rng: np.random.Generator, dt: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Start step (in the simulated series) and length in steps of n outages.
+        """
+        steps_per_day = int(round(24 / dt))
+        weights = np.ones(24) if request.start_hour_weights is None else np.asarray(request.start_hour_weights, dtype=np.float64)
+        hour = rng.choice(24, size=n, p=weights / weights.sum())
+        step_in_day = ((hour + rng.random(n)) / dt).astype(np.int64)
+        start = rng.integers(0, request.days, n) * steps_per_day + np.minimum(step_in_day, steps_per_day - 1)
+
+        if request.duration_distribution == "lognormal":
+            hours = request.duration_hours * np.exp(request.duration_sigma * rng.standard_normal(n))
+        elif request.duration_distribution == "exponential":
+            hours = rng.exponential(request.duration_hours, n)
+        else:
+            hours = np.full(n, request.duration_hours)
+        length = np.clip(np.round(hours / dt), 1, max(int(round(request.max_duration_hours / dt)), 1)).astype(np.int64)
+        return start, length
+
+    @staticmethod
+    def island(config: SimulationConfig, load: np.ndarray, solar: np.ndarray, active: np.ndarray, soc0: np.ndarray, dt: float) -> np.ndarray:
+        """
+        Unserved load per step of islanded operation, arrays (samples, steps).
+        Steps past the end of an outage (active False) leave the battery untouched.
+        """
+        capacity = CalculatorService.battery_capacity(config) * config.num_stations
+        max_power = config.battery_max_charge_power * config.num_stations * dt
+        solar_used = np.minimum(solar, load)
+        deficit = load - solar_used
+        surplus = solar - solar_used
+        delta = np.where(deficit > 0, -np.minimum(deficit, max_power), np.minimum(surplus * config.inverter_efficiency, max_power))
+        delta = np.where(active, delta, 0.0)
+        soc = bounded_cumsum(soc0, delta, np.zeros_like(delta), np.full_like(delta, capacity))
+        from_battery = np.maximum(-np.diff(soc, axis=-1, prepend=soc0[..., None]), 0)
+        return np.where(active, np.maximum(deficit - from_battery, 0), 0.0)
+
+    @staticmethod
+    def run(request: OutageRequest) -> dict:
+        config = CalculatorService.resolve_config(request.config)
+        dt = config.time_resolution_minutes / 60.0
+        rng = np.random.default_rng(request.seed)
+
+        # One continuous baseline, long enough for the longest outage of the last day
+        max_steps = max(int(round(request.max_duration_hours / dt)), 1)
+        days = request.days + int(np.ceil(max_steps * dt / 24))
+        station_demand = CalculatorService.sample_station_demand(config, days, rng, dt)
+        ev_load = station_demand.sum(axis=1).ravel()
+        base_load = CalculatorService.sample_base_load(config, days, rng, dt)
+        base_load = np.zeros_like(ev_load) if base_load is None else base_load.ravel()
+        solar = CalculatorService.sample_solar(config, days, rng, dt, day_index=request.day_index).ravel()
+        rates = CalculatorService.get_rate_schedule(config, solar.size, dt, day_index=request.day_index)
+        baseline = CalculatorService.simulate_site(
+            config, station_demand.transpose(1, 0, 2).reshape(config.num_stations, -1), solar, rates, dt, base_load=base_load,
+        )
+        initial_soc = config.initial_soc_fraction * CalculatorService.battery_capacity(config) * config.num_stations
+        soc_before = np.concatenate([[initial_soc if config.use_battery else 0.0], baseline["battery_soc_arr"][:-1]])
+
+        # Prefix sums give per-outage totals without gathering the windows
+        load = base_load + ev_load
+        zero = np.zeros(1)
+        ev_cumsum = np.concatenate([zero, np.cumsum(ev_load)])
+        deficit_cumsum = np.concatenate([zero, np.cumsum(np.maximum(load - solar, 0))])
+
+        stats = {k: StreamingStats() for k in OUTAGE_METRICS}
+        sketches = {k: QuantileSketch() for k in OUTAGE_METRICS}
+        ridden_through = 0
+        starts, lengths = OutageSimulator.sample_outages(request, request.samples, rng, dt)
+        order = np.argsort(lengths, kind="stable")
+        for first in range(0, request.samples, SAMPLES_PER_CHUNK):
+            chunk = order[first:first + SAMPLES_PER_CHUNK]
+            start, length = starts[chunk], lengths[chunk]
+            end = start + length
+            window = start[:, None] + np.arange(length.max())
+            active = window < end[:, None]
+
+            unserved = OutageSimulator.island(config, load[window], solar[window], active, soc_before[start], dt)
+            # The EV stations are shed before the household
+            ev_unserved = np.minimum(unserved, np.where(active, ev_load[window], 0))
+            short = unserved > UNSERVED_TOL
+            backup_steps = np.where(short.any(axis=1), short.argmax(axis=1), length)
+            ridden_through += int((~short.any(axis=1)).sum())
+
+            values = {
+                "duration_hours": length * dt,
+                "backup_hours": backup_steps * dt,
+                "ev_demand_kwh": ev_cumsum[end] - ev_cumsum[start],
+                "ev_unserved_kwh": ev_unserved.sum(axis=1),
+                "load_unserved_kwh": unserved.sum(axis=1),
+                "unserved_without_battery_kwh": deficit_cumsum[end] - deficit_cumsum[start],
+            }
+            for k in OUTAGE_METRICS:
+                stats[k].update(values[k])
+                sketches[k].update(values[k])
+
+        metrics = {}
+        for k in OUTAGE_METRICS:
+            p5, p50, p95 = sketches[k].quantile([0.05, 0.5, 0.95])
+            metrics[k] = {**stats[k].result(), "p5": p5, "p50": p50, "p95": p95}
+        ev_demand = metrics["ev_demand_kwh"]["sum"]
+        return {
+            "samples": request.samples,
+            "battery_capacity_kwh": CalculatorService.battery_capacity(config) * config.num_stations,
+            "full_backup_probability": ridden_through / request.samples,
+            "ev_served_fraction": 1 - metrics["ev_unserved_kwh"]["sum"] / ev_demand if ev_demand > 0 else 1.0,
+            "metrics": metrics,
+        }
@@ -0,0 +1,160 @@
+from typing import Dict, Optional
+import numpy as np
+from schemas.simulation import SimulationConfig, SizingRequest
+from services.calculator import CalculatorService
+from services.components import ComponentBundle
+from services.dispatch import DISPATCH_STRATEGIES, GreedyDispatch, schedule_flows
+from services.finance import FinanceService
+from services.solar import SolarGeometry
+from services.tariffs import TariffService
+from services.weather import WeatherLibrary
+
+# Roof area taken by one kWp of modules, spacing included (m2)
+AREA_PER_KWP = 5.5
+# Solar candidates as shares of the size whose yearly output equals the yearly load
+SOLAR_FRACTIONS = np.array([0.25, 0.5, 0.75, 1.0, 1.25, 1.5])
+BATTERY_PACK_OPTIONS = np.arange(5)
+
+class SizingService:
+    """
+    Quick residential sizing from a monthly bill: every (solar kW, battery packs)
+    candidate is simulated on the same random days in one batch, candidates on the
+    leading axis, and the one with the best lifetime NPV is recommended.
+    """
+
+    @staticmethod
+    def config_from_quote(request: SizingRequest, bundle: Optional[ComponentBundle] = None) -> SimulationConfig:
+        """
+        Residential config for a quote: bill and usage profile, roof orientation and
+        shading from property_details, the location when it is "lat,lon" with a weather
+        site near enough (otherwise the synthetic profile) and the battery / inverter
+        numbers of the catalog products.
+        """
+        overrides = {
+            **(bundle.overrides() if bundle is not None else {}),
+            "site_type": "residential",
+            "monthly_bill": request.monthly_bill,
+            "usage_profile_type": request.usage_profile_type,
+            **SolarGeometry.roof_parameters(request.property_details),
+        }
+        location = WeatherLibrary.parse_location(request.location)
+        if location is not None and WeatherLibrary.covers(*location):
+            overrides["latitude"], overrides["longitude"] = location
+        return SimulationConfig(**{**request.base_config.dict(), **overrides})
+
+    @staticmethod
+    def candidates(monthly_kwh: float, kwh_per_kwp_day: float, max_solar_kw: float, panel_kw: Optional[float] = None):
+        """
+        (solar kW, battery packs) of every candidate, flattened. Solar sizes are
+        rounded to 0.1 kW, or to whole panels of `panel_kw`, and capped by the roof.
+        """
+        target_kw = monthly_kwh * 12 / 365 / max(kwh_per_kwp_day, 1e-6)
+        if panel_kw is None:
+            solar_kw = np.unique(np.clip(np.round(SOLAR_FRACTIONS * target_kw, 1), 0.1, max_solar_kw))
+        else:
+            max_panels = max(np.floor(max_solar_kw / panel_kw), 1)
+            solar_kw = np.unique(np.clip(np.round(SOLAR_FRACTIONS * target_kw / panel_kw), 1, max_panels)) * panel_kw
+        solar_kw, packs = np.meshgrid(solar_kw, BATTERY_PACK_OPTIONS, indexing="ij")
+        return solar_kw.ravel(), packs.ravel()
+
+    @staticmethod
+    def simulate(config: SimulationConfig, solar_unit: np.ndarray, load: np.ndarray, rates: np.ndarray,
+                 solar_kw: np.ndarray, packs: np.ndarray, power_kw: np.ndarray, dt: float) -> Dict[str, np.ndarray]:
+        """
+        Site flows of all candidates at once, arrays shaped (candidates, days, steps).
+        The battery capacity and power (`power_kw`) are per-candidate columns, which the rule-based
+        strategies broadcast; the optimal strategy needs a scalar size, so sizing uses greedy then.
+        """
+        solar = solar_kw[:, None, None] * solar_unit
+        solar_used = np.minimum(solar, load)
+        remaining = load - solar_used
+        leftover_solar = solar - solar_used
+
+        pack_kwh = config.battery_pack_Ah * config.battery_pack_voltage / 1000.0
+        capacity = (packs * pack_kwh * config.use_battery)[:, None, None]
+        max_power = np.where(packs > 0, power_kw, 0.0)[:, None, None]
+        soc0 = np.broadcast_to(config.initial_soc_fraction * capacity[..., 0], remaining.shape[:-1])
+        strategy = GreedyDispatch if config.dispatch_strategy == "optimal" else DISPATCH_STRATEGIES[config.dispatch_strategy]
+        soc = strategy.schedule(config, remaining, leftover_solar, rates, dt, soc0, capacity, max_power)
+        change = np.diff(soc, axis=-1, prepend=soc0[..., None])
+        discharged, charged, grid_charged = schedule_flows(config, remaining, leftover_solar, change)
+        exports = CalculatorService.export_flows(config, solar, leftover_solar - charged / config.inverter_efficiency, rates, dt)
+        return {
+            "grid_import": remaining - discharged + grid_charged,
+            "discharged": discharged,
+            "solar_on_site": solar_used + charged,
+            "solar": solar,
+            "export_revenue": exports["export_revenue_arr"],
+        }
+
+    @staticmethod
+    def monthly_cost(config: SimulationConfig, energy: np.ndarray, rates: np.ndarray, days: int) -> np.ndarray:
+        """
+        Average monthly grid bill ($) of per-step energy (..., days, steps).
+        """
+        if config.tariff_type == "tiered":
+            return TariffService.tiered_bill(config, energy.sum(axis=(-2, -1)) * 30 / days)
+        return (energy * rates).sum(axis=(-2, -1)) * 30 / days
+
+    @staticmethod
+    def size(request: SizingRequest, bundle: Optional[ComponentBundle] = None) -> dict:
+        """
+        With a bundle of catalog products, solar comes in whole panels, a pack is one
+        battery unit and the battery power is the units' rating capped by the inverter.
+        """
+        config = CalculatorService.resolve_config(SizingService.config_from_quote(request, bundle))
+        panel_kw = bundle.panel_kw if bundle is not None else None
+        battery_units = bundle is not None and bundle.battery_kwh is not None
+        dt = config.time_resolution_minutes / 60.0
+        days = request.days
+        rng = np.random.default_rng(request.seed)
+
+        # Shared inputs: per-kWp solar, household (+ EV) load and the rates of the days
+        solar_unit = CalculatorService.sample_solar(config.copy(update={"solar_capacity": 1.0}), days, rng, dt)
+        load = CalculatorService.sample_base_load(config, days, rng, dt)
+        load = load + CalculatorService.sample_station_demand(config, days, rng, dt).sum(axis=1)
+        rates = CalculatorService.get_rate_schedule(config, solar_unit.shape[-1], dt)
+
+        monthly_kwh = CalculatorService.bill_to_monthly_kwh(config)
+        max_solar_kw = np.floor(request.roof_area / AREA_PER_KWP * 10) / 10 if request.roof_area else np.inf
+        solar_kw, packs = SizingService.candidates(monthly_kwh, solar_unit.sum(axis=-1).mean(), max_solar_kw, panel_kw)
+        power_kw = bundle.battery_power_kw(packs) if battery_units else np.full(packs.shape, config.battery_max_charge_power)
+
+        flows = SizingService.simulate(config, solar_unit, load, rates, solar_kw, packs, power_kw, dt)
+        bill_before = float(SizingService.monthly_cost(config, load, rates, days))
+        bill_after = SizingService.monthly_cost(config, flows["grid_import"], rates, days)
+        degradation = flows["discharged"].sum(axis=(-2, -1)) * 30 / days * config.battery_degradation_cost
+        export_revenue = flows["export_revenue"].sum(axis=(-2, -1)) * 30 / days
+        monthly_savings = bill_before - bill_after - degradation + export_revenue
+
+        records = []
+        for j in range(solar_kw.size):
+            candidate = config.copy(update={"solar_capacity": float(solar_kw[j]), "number_of_battery_packs": int(packs[j]),
+                                            "use_battery": config.use_battery and packs[j] > 0,
+                                            "battery_max_charge_power": float(power_kw[j])})
+            capital_cost = CalculatorService.compute_infrastructure_cost(candidate)
+            annual_savings = float(monthly_savings[j]) * 12
+            flows_j = FinanceService.cash_flows(candidate, [annual_savings], 0.0, FinanceService.sample_assumptions(candidate, 1))
+            solar_total = float(flows["solar"][j].sum())
+            records.append({
+                "solar_kw": float(solar_kw[j]),
+                "panels": int(round(solar_kw[j] / panel_kw)) if panel_kw else None,
+                "battery_packs": int(packs[j]),
+                "battery_kwh": float(packs[j] * config.battery_pack_Ah * config.battery_pack_voltage / 1000.0),
+                "capital_cost": capital_cost,
+                "monthly_bill_after": float(bill_after[j]),
+                "monthly_export_revenue": float(export_revenue[j]),
+                "monthly_savings": float(monthly_savings[j]),
+                "payback_years": capital_cost / annual_savings if annual_savings > 0 else -1,
+                "npv": float(FinanceService.npv(flows_j, candidate.discount_rate)[0]),
+                "self_consumption_ratio": float(flows["solar_on_site"][j].sum()) / solar_total if solar_total > 0 else 0.0,
+                "self_sufficiency_ratio": 1 - float(flows["grid_import"][j].sum() / load.sum()) if load.sum() > 0 else 0.0,
+            })
+
+        return {
+            "monthly_kwh": monthly_kwh,
+            "monthly_bill_before": bill_before,
+            "max_solar_kw": None if np.isinf(max_solar_kw) else float(max_solar_kw),
+            "recommended": max(records, key=lambda r: r["npv"]),
+            "candidates": records,
+        }
@@ -0,0 +1,134 @@
+from functools import lru_cache
+from typing import Any, Dict
+import numpy as np
+
+SOLAR_CONSTANT = 1367.0 # W/m2
+# Below this cos(zenith) (sun within ~4 degrees of the horizon) beam irradiance is ignored
+MIN_COS_ZENITH = 0.065
+
+# property_details vocabulary of the quote wizard
+ROOF_TILTS = {"flat": 5.0, "concrete": 5.0, "metal": 15.0, "tile": 25.0, "shingle": 25.0}
+SHADING_LOSSES = {"none": 0.0, "light": 0.05, "partial": 0.15, "heavy": 0.35}
+COMPASS = {"N": 0.0, "NE": 45.0, "E": 90.0, "SE": 135.0, "S": 180.0, "SW": 225.0, "W": 270.0, "NW": 315.0}
+
+class SolarGeometry:
+    """
+    Sun position and plane-of-array (POA) irradiance for the 8760 hours of a typical
+    year, all hours in one vectorized call. Hour i covers [i, i + 1) local standard
+    time, as in TMY / EPW files, and is evaluated at its midpoint.
+    Azimuths are compass bearings in degrees (0 = north, 180 = south).
+
+    Geometry depends only on the location and the panel orientation, so it is cached
+    per (lat, lon, tz) and per (lat, lon, tz, tilt, azimuth): roofs in the same area
+    with the same orientation share the trigonometry.
+    """
+
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def position(latitude: float, longitude: float, timezone: float) -> Dict[str, np.ndarray]:
+        """
+        cos(zenith), sun azimuth (radians) and extraterrestrial normal irradiance (W/m2)
+        per hour. Spencer's series for declination and the equation of time.
+        """
+        hour = np.arange(8760) + 0.5
+        day_angle = 2 * np.pi * (hour // 24 + (hour % 24 - 12) / 24) / 365
+        harmonics = [np.cos(k * day_angle) for k in (1, 2, 3)] + [np.sin(k * day_angle) for k in (1, 2, 3)]
+        c1, c2, c3, s1, s2, s3 = harmonics
+        declination = 0.006918 - 0.399912 * c1 + 0.070257 * s1 - 0.006758 * c2 + 0.000907 * s2 - 0.002697 * c3 + 0.00148 * s3
+        eot_minutes = 229.18 * (0.000075 + 0.001868 * c1 - 0.032077 * s1 - 0.014615 * c2 - 0.040849 * s2)
+
+        solar_time = hour % 24 + (eot_minutes + 4 * longitude - 60 * timezone) / 60
+        hour_angle = np.radians(15 * (solar_time - 12))
+        lat = np.radians(latitude)
+        cos_zenith = np.sin(lat) * np.sin(declination) + np.cos(lat) * np.cos(declination) * np.cos(hour_angle)
+        azimuth = np.pi + np.arctan2(np.sin(hour_angle), np.cos(hour_angle) * np.sin(lat) - np.tan(declination) * np.cos(lat))
+        result = {
+            "cos_zenith": np.clip(cos_zenith, -1, 1),
+            "azimuth": azimuth,
+            "extraterrestrial": SOLAR_CONSTANT * (1 + 0.033 * c1),
+        }
+        for values in result.values():
+            values.setflags(write=False)
+        return result
+
+    @staticmethod
+    def clear_sky(latitude: float, longitude: float, timezone: float) -> np.ndarray:
+        """
+        Haurwitz clear-sky global horizontal irradiance (W/m2) per hour.
+        """
+        cos_z = SolarGeometry.position(latitude, longitude, timezone)["cos_zenith"]
+        return np.where(cos_z > 0, 1098.0 * cos_z * np.exp(-0.057 / np.maximum(cos_z, 1e-3)), 0.0)
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def incidence(latitude: float, longitude: float, timezone: float, tilt: float, azimuth: float) -> np.ndarray:
+        """
+        cos(angle of incidence) of the sun on the panel per hour, 0 when the sun is
+        behind the panel or below the horizon.
+        """
+        sun = SolarGeometry.position(latitude, longitude, timezone)
+        cos_z = sun["cos_zenith"]
+        sin_z = np.sqrt(1 - cos_z ** 2)
+        beta = np.radians(tilt)
+        cos_aoi = cos_z * np.cos(beta) + sin_z * np.sin(beta) * np.cos(sun["azimuth"] - np.radians(azimuth))
+        cos_aoi = np.where(cos_z > 0, np.maximum(cos_aoi, 0), 0)
+        cos_aoi.setflags(write=False)
+        return cos_aoi
+
+    @staticmethod
+    def decompose(ghi: np.ndarray, cos_zenith: np.ndarray, extraterrestrial: np.ndarray):
+        """
+        Erbs split of global horizontal irradiance into (DNI, DHI).
+        """
+        horizontal_extra = extraterrestrial * np.maximum(cos_zenith, MIN_COS_ZENITH)
+        kt = np.clip(ghi / horizontal_extra, 0, 1)
+        kd = np.where(kt <= 0.22, 1 - 0.09 * kt,
+             np.where(kt <= 0.8, 0.9511 - 0.1604 * kt + 4.388 * kt ** 2 - 16.638 * kt ** 3 + 12.336 * kt ** 4, 0.165))
+        dhi = kd * ghi
+        dni = np.where(cos_zenith > MIN_COS_ZENITH, (ghi - dhi) / np.maximum(cos_zenith, MIN_COS_ZENITH), 0)
+        return dni, dhi
+
+    @staticmethod
+    def plane_of_array(ghi: np.ndarray, dni: np.ndarray, dhi: np.ndarray, latitude: float, longitude: float, timezone: float,
+                       tilt: float, azimuth: float, shading: float = 0.0, albedo: float = 0.2) -> np.ndarray:
+        """
+        Hourly POA irradiance (W/m2) with an isotropic sky: beam on the panel, sky
+        diffuse seen by the tilted plane and ground-reflected light. Missing (NaN)
+        DNI / DHI are estimated from GHI. `shading` is the share of beam irradiance lost.
+        """
+        sun = SolarGeometry.position(latitude, longitude, timezone)
+        if np.isnan(dni).any() or np.isnan(dhi).any():
+            dni, dhi = SolarGeometry.decompose(ghi, sun["cos_zenith"], sun["extraterrestrial"])
+        cos_aoi = SolarGeometry.incidence(latitude, longitude, timezone, tilt, azimuth)
+        cos_beta = np.cos(np.radians(tilt))
+        beam = dni * cos_aoi * (1 - shading)
+        sky = dhi * (1 + cos_beta) / 2
+        ground = ghi * albedo * (1 - cos_beta) / 2
+        return beam + sky + ground
+
+    @staticmethod
+    def roof_parameters(property_details: Dict[str, Any]) -> dict:
+        """
+        SimulationConfig overrides (panel_tilt, panel_azimuth, shading_loss) from a quote's
+        property_details. Accepts numbers or the wizard's words ("tile", "S", "partial");
+        shading above 1 is read as a percentage. Unknown values are left out.
+        """
+        details = property_details or {}
+        update = {}
+        if details.get("tilt") is not None:
+            update["panel_tilt"] = float(details["tilt"])
+        elif str(details.get("roof_type", "")).lower() in ROOF_TILTS:
+            update["panel_tilt"] = ROOF_TILTS[str(details["roof_type"]).lower()]
+
+        azimuth = details.get("azimuth")
+        if isinstance(azimuth, str) and azimuth.strip().upper() in COMPASS:
+            update["panel_azimuth"] = COMPASS[azimuth.strip().upper()]
+        elif isinstance(azimuth, (int, float)):
+            update["panel_azimuth"] = float(azimuth) % 360
+
+        shading = details.get("shading")
+        if isinstance(shading, str) and shading.lower() in SHADING_LOSSES:
+            update["shading_loss"] = SHADING_LOSSES[shading.lower()]
+        elif isinstance(shading, (int, float)):
+            update["shading_loss"] = float(shading) / 100 if shading > 1 else float(shading)
+        return update
@@ -0,0 +1,289 @@
+import csv
+import json
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List
+import numpy as np
+from schemas.simulation import SimulationConfig
+
+# Non-leap calendar used to map simulated days to billing months
+DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+MONTH_OF_DAY = np.repeat(np.arange(12), DAYS_IN_MONTH)
+
+# TOU period codes
+OFF_PEAK, NORMAL, PEAK = 0, 1, 2
+PERIOD_CODES = {"off_peak": OFF_PEAK, "normal": NORMAL, "peak": PEAK}
+DAY_TYPES = ["weekday", "saturday", "sunday", "holiday"]
+
+TARIFF_DIR = Path(__file__).resolve().parent.parent / "data" / "tariffs"
+
+class TariffService:
+    @staticmethod
+    def tou_periods(config: SimulationConfig, steps: int, dt: float, day_index: int = 0) -> np.ndarray:
+        """
+        TOU period (OFF_PEAK / NORMAL / PEAK) of each step, starting at day `day_index`.
+        Sunday is NORMAL all day. Library tariffs (`tariff_id`) use their compiled periods.
+        """
+        if config.tariff_id is not None:
+            return TariffLibrary.window(config, "periods", steps, dt, day_index)
+        current_time = np.arange(steps) * dt
+        time_in_day = current_time % 24
+        day_of_week = (day_index + (current_time // 24).astype(int)) % 7
+
+        is_off_peak = (time_in_day < 4) | (time_in_day >= 22)
+        is_peak = ((config.peak_start_morning <= time_in_day) & (time_in_day < config.peak_end_morning)) | \
+                  ((config.peak_start_evening <= time_in_day) & (time_in_day < config.peak_end_evening))
+
+        periods = np.where(is_off_peak, OFF_PEAK, np.where(is_peak, PEAK, NORMAL))
+        return np.where(day_of_week == 6, NORMAL, periods)
+
+    @staticmethod
+    def month_ids(steps: int, dt: float, day_index: int = 0) -> np.ndarray:
+        """
+        Billing month (0-11) of each step.
+        """
+        day = day_index + (np.arange(steps) * dt // 24).astype(int)
+        return MONTH_OF_DAY[day % 365]
+
+    @staticmethod
+    def demand_kw(grid_import: np.ndarray, dt: float, window_minutes: int) -> np.ndarray:
+        """
+        Average import (kW) over the trailing demand window ending at each step.
+        Rolling sums come from one cumsum along the time axis. Windows shorter than
+        a step fall back to the step average.
+        """
+        window = max(1, int(round(window_minutes / 60.0 / dt)))
+        csum = np.cumsum(grid_import, axis=-1, dtype=np.float64)
+        csum = np.concatenate([np.zeros(csum.shape[:-1] + (1,)), csum], axis=-1)
+        end = np.arange(1, grid_import.shape[-1] + 1)
+        start = np.maximum(end - window, 0)
+        return (csum[..., end] - csum[..., start]) / (window * dt)
+
+    @staticmethod
+    def monthly_peaks(config: SimulationConfig, grid_import: np.ndarray, dt: float, day_index: int = 0) -> dict:
+        """
+        Per-month maximum demand (kW) for all hours and for PEAK TOU hours only.
+        Returns the months covered and (..., months) arrays, computed with
+        maximum.reduceat over the month segments of the series.
+        """
+        steps = grid_import.shape[-1]
+        demand = TariffService.demand_kw(grid_import, dt, config.demand_window_minutes)
+        months = TariffService.month_ids(steps, dt, day_index)
+        starts = np.flatnonzero(np.diff(months, prepend=-1))
+
+        in_peak = TariffService.tou_periods(config, steps, dt, day_index) == PEAK
+        return {
+            "months": months[starts],
+            "peak_kw": np.maximum.reduceat(demand, starts, axis=-1),
+            "tou_peak_kw": np.maximum.reduceat(np.where(in_peak, demand, 0.0), starts, axis=-1),
+        }
+
+    @staticmethod
+    def demand_charges(config: SimulationConfig, peak_kw: np.ndarray, tou_peak_kw: np.ndarray) -> np.ndarray:
+        """
+        Demand charge per billed month ($): facility charge on the monthly peak plus
+        the TOU charge on the peak reached inside peak windows.
+        """
+        return peak_kw * config.demand_charge_rate + tou_peak_kw * config.peak_demand_charge_rate
+
+    # --- Tiered (increasing block) pricing ---
+
+    @staticmethod
+    def tier_curve(config: SimulationConfig):
+        """
+        Block lower bounds (kWh), cumulative cost at each lower bound and the block rates.
+        """
+        thresholds = np.asarray(config.tier_thresholds_kwh, dtype=np.float64)
+        rates = np.asarray(config.tier_rates, dtype=np.float64)
+        if rates.size != thresholds.size + 1:
+            raise ValueError(f"tier_rates needs {thresholds.size + 1} entries for {thresholds.size} thresholds")
+        lower = np.concatenate([[0.0], thresholds])
+        base = np.concatenate([[0.0], np.cumsum(np.diff(lower) * rates[:-1])])
+        return lower, base, rates
+
+    @staticmethod
+    def tiered_bill(config: SimulationConfig, monthly_kwh) -> np.ndarray:
+        """
+        Energy bill ($) for a month with `monthly_kwh` of cumulative import.
+        """
+        lower, base, rates = TariffService.tier_curve(config)
+        kwh = np.maximum(np.asarray(monthly_kwh, dtype=np.float64), 0)
+        block = np.searchsorted(lower, kwh, side="right") - 1
+        return base[block] + (kwh - lower[block]) * rates[block]
+
+    @staticmethod
+    def tiered_kwh(config: SimulationConfig, bill) -> np.ndarray:
+        """
+        Monthly kWh whose tiered bill is `bill` (inverse of tiered_bill).
+        """
+        lower, base, rates = TariffService.tier_curve(config)
+        bill = np.maximum(np.asarray(bill, dtype=np.float64), 0)
+        block = np.searchsorted(base, bill, side="right") - 1
+        return lower[block] + (bill - base[block]) / rates[block]
+
+    @staticmethod
+    def tiered_costs(config: SimulationConfig, grid_import: np.ndarray, dt: float, day_index: int = 0, month_to_date: float = 0.0):
+        """
+        Per-step energy cost of a continuous import series under block pricing.
+        The cumulative import restarts every billing month; each step pays the
+        bill increase it causes, so steps that cross a threshold are split exactly.
+        `month_to_date` is import already billed in the first month (e.g. from a previous chunk).
+        Returns (costs, cumulative import of the last month at the end of the series).
+        """
+        steps = grid_import.shape[-1]
+        months = TariffService.month_ids(steps, dt, day_index)
+        starts = np.flatnonzero(np.diff(months, prepend=-1))
+        segment = np.cumsum(np.isin(np.arange(steps), starts)) - 1
+
+        csum = np.cumsum(grid_import, axis=-1, dtype=np.float64)
+        before = csum[..., starts] - grid_import[..., starts]
+        cumulative = csum - before[..., segment]
+        cumulative[..., segment == 0] += month_to_date
+
+        costs = TariffService.tiered_bill(config, cumulative) - TariffService.tiered_bill(config, cumulative - grid_import)
+        return costs, cumulative[..., -1]
+
+    @staticmethod
+    def representative_day_costs(config: SimulationConfig, grid_import: np.ndarray, days_per_month: int = 30) -> np.ndarray:
+        """
+        Block pricing for a simulated day that stands for every day of the month:
+        each kWh pays the average rate of a month with days_per_month such days.
+        """
+        monthly_kwh = grid_import.sum(axis=-1, dtype=np.float64) * days_per_month
+        average_rate = TariffService.tiered_bill(config, monthly_kwh) / np.where(monthly_kwh > 0, monthly_kwh, 1)
+        return grid_import * average_rate[..., None].astype(grid_import.dtype)
+
+class TariffLibrary:
+    """
+    Utility tariffs loaded from files in data/tariffs/ and compiled to dense per-step
+    arrays for a whole year.
+
+    JSON files hold a full definition:
+        {"id", "name", "default_rate", "periods": [...], "holidays": ["MM-DD", ...],
+         "tiers": {"thresholds_kwh": [...], "rates": [...]},
+         "demand_charges": {"rate", "peak_rate", "window_minutes"}}
+    CSV files hold only the TOU blocks, one period per row, with the file name as id:
+        months,days,start,end,period,rate
+
+    A period applies to `months` (1-12, "all" or ranges like "1-3;10-12"), `days`
+    (weekday / saturday / sunday / holiday, ";"-separated, or "all") and the hours
+    [start, end), which may wrap past midnight. Later periods override earlier ones.
+    Holidays use the Sunday blocks unless a period names them.
+    """
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def definitions() -> Dict[str, dict]:
+        tariffs = {}
+        for path in sorted(TARIFF_DIR.glob("*.json")):
+            with open(path) as f:
+                definition = json.load(f)
+            tariffs[definition.get("id", path.stem)] = definition
+        for path in sorted(TARIFF_DIR.glob("*.csv")):
+            with open(path, newline="") as f:
+                periods = list(csv.DictReader(f))
+            tariffs[path.stem] = {"id": path.stem, "name": path.stem, "periods": periods}
+        return tariffs
+
+    @staticmethod
+    def get(tariff_id: str) -> dict:
+        tariffs = TariffLibrary.definitions()
+        if tariff_id not in tariffs:
+            raise ValueError(f"Unknown tariff_id '{tariff_id}', available: {sorted(tariffs)}")
+        return tariffs[tariff_id]
+
+    @staticmethod
+    def parse_months(value) -> List[int]:
+        if isinstance(value, list):
+            return [int(m) for m in value]
+        if value in (None, "", "all"):
+            return list(range(1, 13))
+        months = []
+        for part in str(value).split(";"):
+            first, _, last = part.strip().partition("-")
+            months.extend(range(int(first), int(last or first) + 1))
+        return months
+
+    @staticmethod
+    def parse_days(value) -> List[str]:
+        if isinstance(value, list):
+            return value
+        if value in (None, "", "all"):
+            return list(DAY_TYPES)
+        return [d.strip() for d in str(value).split(";")]
+
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def compile(tariff_id: str, year: int, resolution_minutes: int) -> dict:
+        """
+        Rate ($/kWh) and TOU period code of every step of `year`, on the engine's
+        365-day calendar (Feb 29 is dropped on leap years). Arrays are read-only
+        because the result is shared by every simulation using this tariff.
+        """
+        definition = TariffLibrary.get(tariff_id)
+        days = np.arange(f"{year}-01-01", f"{year + 1}-01-01", dtype="datetime64[D]")
+        month = days.astype("datetime64[M]").astype(int) % 12 + 1
+        day_of_month = (days - days.astype("datetime64[M]")).astype(int) + 1
+        keep = ~((month == 2) & (day_of_month == 29))
+        days, month, day_of_month = days[keep], month[keep], day_of_month[keep]
+
+        weekday = (days.astype(int) + 3) % 7 # 1970-01-01 was a Thursday, 0 = Monday
+        day_type = np.where(weekday < 5, 0, np.where(weekday == 5, 1, 2))
+        holidays = [int(m) * 100 + int(d) for m, d in (h.split("-") for h in definition.get("holidays", []))]
+        is_holiday = np.isin(month * 100 + day_of_month, holidays)
+        names_holiday = any("holiday" in TariffLibrary.parse_days(p.get("days")) for p in definition["periods"])
+        day_type = np.where(is_holiday, DAY_TYPES.index("holiday" if names_holiday else "sunday"), day_type)
+
+        steps_per_day = 1440 // resolution_minutes
+        hour = np.tile(np.arange(steps_per_day) * resolution_minutes / 60.0, days.size)
+        month = np.repeat(month, steps_per_day)
+        day_type = np.repeat(day_type, steps_per_day)
+
+        rates = np.full(hour.size, float(definition.get("default_rate", 0.0)))
+        periods = np.full(hour.size, NORMAL, dtype=np.int8)
+        for period in definition["periods"]:
+            start, end = float(period["start"]), float(period["end"])
+            in_hours = (hour >= start) & (hour < end) if start < end else (hour >= start) | (hour < end)
+            days_mask = np.isin(day_type, [DAY_TYPES.index(d) for d in TariffLibrary.parse_days(period.get("days"))])
+            mask = in_hours & days_mask & np.isin(month, TariffLibrary.parse_months(period.get("months")))
+            rates[mask] = float(period["rate"])
+            periods[mask] = PERIOD_CODES[period.get("period") or "normal"]
+
+        rates.setflags(write=False)
+        periods.setflags(write=False)
+        return {"rates": rates, "periods": periods, "steps_per_day": steps_per_day}
+
+    @staticmethod
+    def window(config: SimulationConfig, key: str, steps: int, dt: float, day_index: int = 0) -> np.ndarray:
+        """
+        `steps` consecutive entries of a compiled array starting at day `day_index` (wraps at year end).
+        """
+        compiled = TariffLibrary.compile(config.tariff_id, config.tariff_year, int(round(dt * 60)))
+        values = compiled[key]
+        start = (day_index % 365) * compiled["steps_per_day"]
+        return np.take(values, np.arange(start, start + steps), mode="wrap")
+
+    @staticmethod
+    def resolve_config(config: SimulationConfig) -> SimulationConfig:
+        """
+        Config with the scalar parts of the library tariff (tiers, demand charges) filled in.
+        Per-step rates and periods are read from the compiled arrays by TariffService.
+        """
+        if config.tariff_id is None:
+            return config
+        definition = TariffLibrary.get(config.tariff_id)
+        update = {}
+        if definition.get("tiers"):
+            update.update(
+                tariff_type="tiered",
+                tier_thresholds_kwh=definition["tiers"]["thresholds_kwh"],
+                tier_rates=definition["tiers"]["rates"],
+            )
+        if definition.get("demand_charges"):
+            charges = definition["demand_charges"]
+            update.update(
+                demand_charge_rate=charges.get("rate", 0.0),
+                peak_demand_charge_rate=charges.get("peak_rate", 0.0),
+                demand_window_minutes=charges.get("window_minutes", config.demand_window_minutes),
+            )
+        return config.copy(update=update)
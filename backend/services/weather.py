@@ -0,0 +1,378 @@
+import csv
+import os
+from functools import lru_cache
+from pathlib import Path
+import math
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from services.solar import SolarGeometry
+
+WEATHER_DIR = Path(__file__).resolve().parent.parent / "data" / "weather"
+CACHE_DIR = WEATHER_DIR / "cache"
+
+HOURS_PER_YEAR = 8760
+# Columns of the cached (8760, 4) array; dni / dhi are NaN when the source only has GHI
+WEATHER_COLUMNS = ["ghi", "dni", "dhi", "temp_air"]
+GHI, DNI, DHI, TEMP_AIR = range(4)
+# First hour of Feb 29 in a leap year of hourly data
+LEAP_DAY_START = (31 + 28) * 24
+
+# Simple PV temperature model: cell temperature rises linearly with irradiance
+# (NOCT 45 C at 800 W/m2) and power drops by TEMP_COEFFICIENT per degree above 25 C
+NOCT = 45.0
+TEMP_COEFFICIENT = -0.004
+
+EARTH_RADIUS_KM = 6371.0
+# Sites within this distance of a location are blended by inverse distance
+IDW_RADIUS_KM = 50.0
+IDW_POWER = 2.0
+# Beyond this distance the nearest site's climate and seasons say little about a location
+MAX_SITE_DISTANCE_KM = 500.0
+# Up to this many sites a scan of all of them beats walking the grid
+SMALL_INDEX = 32
+# Numeric keys of a plain CSV's "#" header, and short names accepted for them
+NUMERIC_HEADER_KEYS = {"latitude", "longitude", "timezone", "elevation"}
+HEADER_ALIASES = {"lat": "latitude", "lon": "longitude", "lng": "longitude"}
+
+class WeatherLibrary:
+    """
+    Hourly irradiance and temperature per site, from typical-year files in data/weather/:
+
+        *.epw   EnergyPlus weather (LOCATION header, GHI / DNI / DHI and dry bulb columns)
+        *.csv   NREL TMY3 (site metadata on the first line, "GHI (W/m^2)" ... header on the second)
+                or a plain CSV with `ghi` and `temp_air` columns (`dni`, `dhi` optional),
+                site metadata on a leading "# name=...,latitude=...,longitude=..." line
+
+    The site id is the file name. Each file is parsed once into a float32 (8760, 4)
+    .npy cache next to it and every later load memory-maps that cache: no parsing
+    per request, and the pages are shared by all worker processes on the machine.
+    The cache is rebuilt when the source file is newer. The bundled sample_*.csv
+    files are synthetic, for development only; real sites need measured TMY data.
+    """
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def sites() -> Dict[str, dict]:
+        """
+        Site metadata (name, latitude, longitude, timezone, format, path) by site id.
+        Only file headers are read.
+        """
+        sites = {}
+        for path in sorted(WEATHER_DIR.glob("*.epw")) + sorted(WEATHER_DIR.glob("*.csv")):
+            with open(path, newline="", encoding="utf-8-sig") as f:
+                first, second = f.readline(), f.readline()
+            if path.suffix == ".epw":
+                fields = first.strip().split(",")
+                meta = {"format": "epw", "name": fields[1], "latitude": float(fields[6]),
+                        "longitude": float(fields[7]), "timezone": float(fields[8])}
+            elif "GHI (W/m^2)" in second:
+                fields = next(csv.reader([first]))
+                meta = {"format": "tmy3", "name": fields[1], "latitude": float(fields[4]),
+                        "longitude": float(fields[5]), "timezone": float(fields[3])}
+            else:
+                meta = {"format": "csv", "name": path.stem, "latitude": None, "longitude": None, "timezone": None}
+                if first.startswith("#"):
+                    meta.update(WeatherLibrary.parse_header(first))
+            sites[path.stem] = {**meta, "path": path}
+        return sites
+
+    @staticmethod
+    def parse_header(line: str) -> dict:
+        """
+        `key=value` pairs of a plain CSV's "#" header. Only the known numeric keys are
+        converted (lat / lon are accepted for latitude / longitude); anything else,
+        like source or a zone name, is kept as a string. A zone name as timezone is
+        kept in timezone_name and the offset estimated from the longitude; other
+        unreadable numbers are left out, so one bad header does not break the index.
+        """
+        meta = {}
+        for item in line.lstrip("#").split(","):
+            key, _, value = item.partition("=")
+            key, value = HEADER_ALIASES.get(key.strip(), key.strip()), value.strip()
+            if not key:
+                continue
+            if key not in NUMERIC_HEADER_KEYS:
+                meta[key] = value
+                continue
+            try:
+                meta[key] = float(value)
+            except ValueError:
+                if key == "timezone":
+                    meta["timezone_name"] = value
+        if "timezone_name" in meta and meta.get("longitude") is not None:
+            meta["timezone"] = float(round(meta["longitude"] / 15))
+        return meta
+
+    @staticmethod
+    def get(site_id: str) -> dict:
+        sites = WeatherLibrary.sites()
+        if site_id not in sites:
+            raise ValueError(f"Unknown weather_site '{site_id}', available: {sorted(sites)}")
+        return sites[site_id]
+
+    @staticmethod
+    def parse(path: Path, fmt: str) -> np.ndarray:
+        """
+        Reads a weather file into a float32 (8760, 4) array of WEATHER_COLUMNS.
+        Leap-year files lose Feb 29, as on the tariff calendar.
+        """
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            if fmt == "epw":
+                rows = list(csv.reader(f))[8:]
+                table = {
+                    "ghi": [r[13] for r in rows], "dni": [r[14] for r in rows],
+                    "dhi": [r[15] for r in rows], "temp_air": [r[6] for r in rows],
+                }
+                leap_day = np.array([r[1] == "2" and r[2] == "29" for r in rows])
+            else:
+                lines = (line for line in f if not line.startswith("#"))
+                if fmt == "tmy3":
+                    next(lines)
+                rows = list(csv.DictReader(lines))
+                names = {"ghi": "GHI (W/m^2)", "dni": "DNI (W/m^2)", "dhi": "DHI (W/m^2)", "temp_air": "Dry-bulb (C)"} \
+                    if fmt == "tmy3" else {c: c for c in WEATHER_COLUMNS}
+                table = {c: [r[names[c]] for r in rows] if names[c] in rows[0] else None for c in WEATHER_COLUMNS}
+                leap_day = np.zeros(len(rows), dtype=bool)
+                if len(rows) == HOURS_PER_YEAR + 24:
+                    leap_day[LEAP_DAY_START:LEAP_DAY_START + 24] = True
+
+        data = np.full((len(leap_day), len(WEATHER_COLUMNS)), np.nan, dtype=np.float32)
+        for i, column in enumerate(WEATHER_COLUMNS):
+            if table[column] is not None:
+                data[:, i] = np.asarray(table[column], dtype=np.float64)
+        data = data[~leap_day]
+        if data.shape[0] != HOURS_PER_YEAR:
+            raise ValueError(f"{path.name}: expected {HOURS_PER_YEAR} hourly rows, got {data.shape[0]}")
+        if np.isnan(data[:, GHI]).any() or np.isnan(data[:, TEMP_AIR]).any():
+            raise ValueError(f"{path.name}: ghi and temp_air are required")
+        data[:, :TEMP_AIR] = np.maximum(data[:, :TEMP_AIR], 0) # Night-time sensor offsets
+        return data
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def load(site_id: str) -> np.ndarray:
+        """
+        Read-only memory-mapped (8760, 4) float32 weather of a site.
+        """
+        site = WeatherLibrary.get(site_id)
+        cache = CACHE_DIR / f"{site_id}.npy"
+        if not cache.exists() or cache.stat().st_mtime < site["path"].stat().st_mtime:
+            data = WeatherLibrary.parse(site["path"], site["format"])
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            # Written under a unique name and renamed, so concurrent workers never map a partial file
+            tmp = CACHE_DIR / f".{site_id}.{os.getpid()}.npy"
+            np.save(tmp, data)
+            os.replace(tmp, cache)
+        return np.load(cache, mmap_mode="r")
+
+    @staticmethod
+    def column(site_id: str, name: str) -> np.ndarray:
+        return WeatherLibrary.load(site_id)[:, WEATHER_COLUMNS.index(name)]
+
+    @staticmethod
+    @lru_cache(maxsize=1)
+    def index() -> "WeatherSiteIndex":
+        """
+        Spatial index over the sites with coordinates, built once per process (at startup).
+        """
+        return WeatherSiteIndex({
+            site_id: (site["latitude"], site["longitude"])
+            for site_id, site in WeatherLibrary.sites().items() if site["latitude"] is not None
+        })
+
+    @staticmethod
+    def parse_location(location: Optional[str]) -> Optional[Tuple[float, float]]:
+        """
+        (lat, lon) from a "lat,lon" location string, None for addresses.
+        """
+        try:
+            lat, lon = (float(part) for part in str(location).split(","))
+        except ValueError:
+            return None
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            return None
+        return lat, lon
+
+    @staticmethod
+    def idw_weights(latitude: float, longitude: float, k: int = 4) -> Dict[str, float]:
+        """
+        Inverse-distance weights of the sites within IDW_RADIUS_KM (nearest k), or
+        the nearest site alone when none is that close. A site on the spot takes all the weight.
+        Raises ValueError when no site is within MAX_SITE_DISTANCE_KM.
+        """
+        nearest = WeatherLibrary.index().nearest(latitude, longitude, k)
+        if not nearest:
+            raise ValueError("No weather site with coordinates in the library")
+        if nearest[0][1] > MAX_SITE_DISTANCE_KM:
+            raise ValueError(
+                f"No weather site within {MAX_SITE_DISTANCE_KM:.0f} km of ({latitude}, {longitude}): "
+                f"the nearest, {nearest[0][0]}, is {nearest[0][1]:.0f} km away"
+            )
+        close = [(site_id, km) for site_id, km in nearest if km <= IDW_RADIUS_KM] or nearest[:1]
+        if close[0][1] < 1e-3:
+            return {close[0][0]: 1.0}
+        inverse = [km ** -IDW_POWER for _, km in close]
+        return {site_id: w / sum(inverse) for (site_id, _), w in zip(close, inverse)}
+
+    @staticmethod
+    def covers(latitude: float, longitude: float) -> bool:
+        """
+        Whether a site is within MAX_SITE_DISTANCE_KM of the location.
+        """
+        nearest = WeatherLibrary.index().nearest(latitude, longitude, 1)
+        return bool(nearest) and nearest[0][1] <= MAX_SITE_DISTANCE_KM
+
+    @staticmethod
+    def weather_at(latitude: float, longitude: float) -> np.ndarray:
+        """
+        (8760, 4) weather at a location, inverse-distance blend of the nearby sites.
+        Missing DNI / DHI in any blended site leave them missing (re-estimated from GHI).
+        """
+        weights = WeatherLibrary.idw_weights(latitude, longitude)
+        return sum(w * WeatherLibrary.load(site_id).astype(np.float64) for site_id, w in weights.items())
+
+    @staticmethod
+    def pv_profile(weather: np.ndarray, latitude: float, longitude: float, timezone: float, resolution_minutes: int,
+                   tilt: float, azimuth: float, shading: float, albedo: float) -> np.ndarray:
+        """
+        PV output per kW installed (kW/kWp) for every step of the year, shape (365, steps_per_day).
+        Plane-of-array irradiance relative to 1000 W/m2, derated for cell temperature.
+        Hourly values are held over sub-hourly steps (energy preserving).
+        """
+        poa = SolarGeometry.plane_of_array(
+            weather[:, GHI], weather[:, DNI], weather[:, DHI],
+            latitude, longitude, timezone, tilt, azimuth, shading, albedo,
+        )
+        cell_temp = weather[:, TEMP_AIR] + (NOCT - 20.0) / 800.0 * poa
+        hourly = poa / 1000.0 * (1 + TEMP_COEFFICIENT * (cell_temp - 25.0))
+        profile = np.repeat(hourly, 60 // resolution_minutes).reshape(365, -1)
+        profile.setflags(write=False)
+        return profile
+
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def pv_yield(site_id: str, resolution_minutes: int, tilt: float = 0.0, azimuth: float = 180.0,
+                 shading: float = 0.0, albedo: float = 0.2) -> np.ndarray:
+        """
+        pv_profile of a library site.
+        """
+        site = WeatherLibrary.get(site_id)
+        return WeatherLibrary.pv_profile(
+            WeatherLibrary.load(site_id).astype(np.float64),
+            site["latitude"] or 0.0, site["longitude"] or 0.0, site["timezone"] or 0.0,
+            resolution_minutes, tilt, azimuth, shading, albedo,
+        )
+
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def pv_yield_at(latitude: float, longitude: float, resolution_minutes: int, tilt: float = 0.0,
+                    azimuth: float = 180.0, shading: float = 0.0, albedo: float = 0.2) -> np.ndarray:
+        """
+        pv_profile at a location from the interpolated weather of the nearby sites.
+        Clock time is the location's nominal zone (longitude / 15 h, rounded), not a
+        site's, so a borrowed site never shifts the sun.
+        """
+        timezone = float(round(longitude / 15))
+        return WeatherLibrary.pv_profile(
+            WeatherLibrary.weather_at(latitude, longitude), latitude, longitude, timezone,
+            resolution_minutes, tilt, azimuth, shading, albedo,
+        )
+
+class WeatherSiteIndex:
+    """
+    Nearest-site queries on a lat/lon grid of `cell_deg` cells (a fixed-precision
+    geohash). A query scans rings of cells around the location and stops once the
+    k-th best great-circle distance is below the distance to any unscanned cell,
+    so only the neighbourhood is looked at however many sites there are.
+    Small libraries are simply scanned.
+    """
+
+    def __init__(self, sites: Dict[str, Tuple[float, float]], cell_deg: Optional[float] = None):
+        if cell_deg is None:
+            # About two sites per cell over the area the sites span
+            lats = [lat for lat, _ in sites.values()] or [0.0]
+            lons = [lon for _, lon in sites.values()] or [0.0]
+            area = max(max(lats) - min(lats), 1.0) * max(max(lons) - min(lons), 1.0)
+            cell_deg = min(10.0, max(0.05, math.sqrt(2 * area / max(len(sites), 1))))
+        # Whole number of columns, so cells keep their width across the antimeridian
+        self.cols = int(math.ceil(360 / cell_deg))
+        self.cell_deg = 360 / self.cols
+        self.rows = int(math.ceil(180 / self.cell_deg))
+        self.size = len(sites)
+        self.cells: Dict[Tuple[int, int], List[Tuple[str, float, float]]] = {}
+        for site_id, (lat, lon) in sites.items():
+            self.cells.setdefault(self.cell(lat, lon), []).append((site_id, math.radians(lat), math.radians(lon)))
+
+    def __len__(self):
+        return self.size
+
+    def cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        row = min(int((lat + 90) // self.cell_deg), self.rows - 1)
+        return row, int(((lon + 180) % 360) // self.cell_deg)
+
+    @staticmethod
+    def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+        """
+        Haversine distance, angles in radians.
+        """
+        a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+    def nearest(self, latitude: float, longitude: float, k: int = 1) -> List[Tuple[str, float]]:
+        """
+        Up to k (site_id, km) pairs, nearest first.
+        """
+        lat, lon = math.radians(latitude), math.radians(longitude)
+        if self.size <= SMALL_INDEX:
+            found = sorted(
+                (self.distance_km(lat, lon, site_lat, site_lon), site_id)
+                for bucket in self.cells.values() for site_id, site_lat, site_lon in bucket
+            )
+            return [(site_id, km) for km, site_id in found[:k]]
+
+        row, col = self.cell(latitude, longitude)
+        found: List[Tuple[float, str]] = []
+        seen = 0
+        for ring in range(max(self.rows, self.cols // 2) + 1):
+            if ring == 0:
+                ring_cells = [(row, col)]
+            else:
+                # Top and bottom rows of the ring, then its left and right columns
+                ring_cells = [(r, c) for r in (row - ring, row + ring) for c in range(col - ring, col + ring + 1)]
+                ring_cells += [(r, c) for r in range(row - ring + 1, row + ring) for c in (col - ring, col + ring)]
+            visited = set()
+            for r, c in ring_cells:
+                key = (r, c % self.cols)
+                if not 0 <= r < self.rows or key in visited:
+                    continue
+                visited.add(key)
+                for site_id, site_lat, site_lon in self.cells.get(key, ()):
+                    found.append((self.distance_km(lat, lon, site_lat, site_lon), site_id))
+                    seen += 1
+            if seen == self.size:
+                break
+            if len(found) >= k:
+                found.sort()
+                del found[k:]
+                if found[-1][0] <= self.unscanned_km(latitude, longitude, row, col, ring):
+                    break
+        found.sort()
+        return [(site_id, km) for km, site_id in found[:k]]
+
+    def unscanned_km(self, latitude: float, longitude: float, row: int, col: int, ring: int) -> float:
+        """
+        Lower bound of the distance from the location to any cell outside the scanned rings.
+        """
+        south = latitude - ((row - ring) * self.cell_deg - 90)
+        north = (row + ring + 1) * self.cell_deg - 90 - latitude
+        lat_km = math.radians(min(south, north)) * EARTH_RADIUS_KM
+        west = (longitude + 180) % 360 - (col - ring) * self.cell_deg
+        east = (col + ring + 1) * self.cell_deg - (longitude + 180) % 360
+        dlon = math.radians(min(west, east))
+        if dlon >= math.pi / 2:
+            # Nearest such point is across the pole
+            lon_km = (math.pi / 2 - abs(math.radians(latitude))) * EARTH_RADIUS_KM
+        else:
+            # Closest approach to a meridian dlon away: sin(d) = cos(lat) sin(dlon)
+            lon_km = math.asin(math.cos(math.radians(latitude)) * math.sin(dlon)) * EARTH_RADIUS_KM
+        return min(lat_km, lon_km)
@@ -264,18 +264,23 @@ def decide_battery_action(time_in_day, battery_soc, battery_capacity, ev_demand,
 
 def generate_ev_demand_schedule(params, dt=0.5):
     """
-    Generate the EV demand schedule for one day (48 half‑hour steps).
-    For each day, randomly select 'charging_sessions_per_day' half‑hour slots 
-    and assign full charging demand (charging_station_power * dt, e.g., 
-    for a 30 kW port with dt=0.5, that is 15 kWh). All other slots are 0.
+    Generate the EV demand schedule for one day (48 half‑hour steps at dt=0.5).
+    For each day, randomly select 'charging_sessions_per_day' sessions of
+    'session_duration_minutes' (default 30) and assign full charging demand
+    (for a 30 kW port and a 30 min session, that is 15 kWh). At finer
+    resolutions a session spans several consecutive steps. All other slots are 0.
     """
-    steps_per_day = int(24 / dt)  # should be 48 for dt = 0.5
+    steps_per_day = int(round(24 / dt))  # should be 48 for dt = 0.5
     ev_demand_schedule = np.zeros(steps_per_day)
     charging_station_power = params["charging_station_power"]
     charging_sessions_per_day = params["charging_sessions_per_day"]
-    # Randomly choose distinct half‑hour slots for charging events
-    selected = np.random.choice(np.arange(steps_per_day), size=charging_sessions_per_day, replace=False)
-    ev_demand_schedule[selected] = charging_station_power * dt
+    session_hours = params.get("session_duration_minutes", 30) / 60
+    block = max(1, int(round(session_hours / dt)))
+    # Randomly choose distinct session blocks for charging events (at most one per block of the day)
+    num_blocks = steps_per_day // block
+    selected = np.random.choice(np.arange(num_blocks), size=min(charging_sessions_per_day, num_blocks), replace=False)
+    steps = (selected[:, None] * block + np.arange(block)).ravel()
+    ev_demand_schedule[steps] = charging_station_power * session_hours / block
     return ev_demand_schedule
 
 def ev_demand_half_hour(current_time, dt, params):
@@ -295,8 +300,8 @@ def ev_demand_half_hour(current_time, dt, params):
  
 
 def run_simulation_system(params, ev_demand_generator):
-    dt = 0.5  # half-hour time step
-    total_steps = int(24 / dt)  # 48 steps for one day
+    dt = params.get("time_resolution_minutes", 30) / 60  # default half-hour time step
+    total_steps = int(round(24 / dt))  # 48 steps for one day at dt = 0.5
 
     # Initialize arrays.
     time_arr = np.zeros(total_steps)
@@ -484,8 +489,8 @@ def simulate_station(params, seed=None):
     """
     if seed is not None:
         np.random.seed(seed)
-    dt = 0.5
-    steps = int(24 / dt)
+    dt = params.get("time_resolution_minutes", 30) / 60
+    steps = int(round(24 / dt))
     time_arr = np.zeros(steps)
     battery_soc_arr = np.zeros(steps)
     grid_import_arr = np.zeros(steps)